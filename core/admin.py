@@ -1,7 +1,9 @@
 # core/admin.py
 from django.contrib import admin
-from .models import CustomUser, Book, Loan
+from .models import CustomUser, Book, Loan, Hold, ArchivedLoan
 
 admin.site.register(CustomUser)
 admin.site.register(Book)
-admin.site.register(Loan)
\ No newline at end of file
+admin.site.register(Loan)
+admin.site.register(Hold)
+admin.site.register(ArchivedLoan)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .authentication import warn_if_tokens_unshared
+        from .cache import warn_if_process_local
+        warn_if_process_local()
+        warn_if_tokens_unshared()
@@ -0,0 +1,114 @@
+# core/archive.py
+
+"""
+Loan archive (`manage.py archive_loans`). Loans returned more than
+LOAN_ARCHIVE_DAYS ago move from Loan to ArchivedLoan, so the Loan table
+and its indexes only hold open and recent loans: the rows /api/loans/
+and the per-user lists actually serve.
+
+Each batch is the oldest LOAN_ARCHIVE_BATCH returned loans: one SELECT of
+their keys on loan_return_date_idx, then one INSERT ... SELECT and one
+DELETE over that key range, in one transaction. Moved rows leave the
+Loan table, so the job needs no checkpoint; an interrupted run just
+starts again from the oldest loan left. The DELETE deliberately skips the
+Loan signals: an archived loan still exists, so it leaves no sync
+tombstone, and delta sync clients keep their copy.
+
+Reads with ?include_archived=1 come from LoanHistory, a view of Loan
+UNION ALL ArchivedLoan created by migration 0011. Later migrations that
+alter either table drop and recreate it (see that migration).
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+
+from .models import ArchivedLoan, Hold, Loan
+
+INCLUDE_ARCHIVED_PARAM = 'include_archived'
+
+# Columns copied as they are; the LoanHistory view reads the same ones from both tables
+ARCHIVE_COLUMNS = ('id', 'user_id', 'book_id', 'loan_date', 'due_date', 'return_date', 'overdue', 'fine', 'updated_at')
+
+
+def include_archived(request):
+    value = request.query_params.get(INCLUDE_ARCHIVED_PARAM, '')
+    return request.method in SAFE_METHODS and value.lower() in ('1', 'true', 'yes')
+
+
+class IncludeArchivedMixin:
+    """
+    Serves safe-method requests with ?include_archived=1 from
+    `history_queryset` (live and archived loans together) instead of the
+    view's queryset. Writes only ever see the Loan table.
+    """
+    history_queryset = None
+
+    def get_queryset(self):
+        if include_archived(self.request):
+            return self.history_queryset.all()
+        return super().get_queryset()
+
+
+def archive_horizon(today=None):
+    return (today or timezone.localdate()) - timedelta(days=settings.LOAN_ARCHIVE_DAYS)
+
+
+def archive_batch(horizon, batch_size):
+    """
+    Moves the oldest `batch_size` loans returned before `horizon` into
+    ArchivedLoan and returns how many moved (0 once none are left).
+    """
+    with transaction.atomic():
+        keys = list(
+            Loan.objects.filter(return_date__lt=horizon)
+            .order_by('return_date', 'id').values_list('return_date', 'id')[:batch_size]
+        )
+        if not keys:
+            return 0
+        last = keys[-1]
+        # The batch is the key range up to its last row; nothing older is
+        # left, and `last` is already before the horizon
+        batch = Loan.objects.filter(return_date__lte=last[0]).exclude(return_date=last[0], id__gt=last[1])
+        rows = batch.annotate(archived_at=Value(timezone.now(), output_field=DateTimeField()))
+        select, params = rows.values_list(*ARCHIVE_COLUMNS, 'archived_at').query.sql_with_params()
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(column) for column in (*ARCHIVE_COLUMNS, 'archived_at'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {qn(ArchivedLoan._meta.db_table)} ({columns}) {select}', params)
+        # What on_delete=SET_NULL would do for holds these loans fulfilled
+        Hold.objects.filter(loan__in=batch).update(loan=None)
+        # A plain SQL DELETE over the same key range: no model instances,
+        # and no per-row post_delete signal
+        keys_select, key_params = batch.values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {qn(Loan._meta.db_table)} WHERE {qn("id")} IN ({keys_select})', key_params)
+            return cursor.rowcount
+
+
+def archive_loans(today=None, batch_size=None, progress=None):
+    """
+    Moves every loan returned before the horizon and returns the totals:
+    loans moved, batches and seconds. `progress` is called with the
+    running totals after each batch.
+    """
+    horizon = archive_horizon(today)
+    batch_size = batch_size or settings.LOAN_ARCHIVE_BATCH
+    totals = {'moved': 0, 'batches': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    while True:
+        moved = archive_batch(horizon, batch_size)
+        if not moved:
+            break
+        totals['moved'] += moved
+        totals['batches'] += 1
+        totals['seconds'] = time.perf_counter() - started
+        if progress:
+            progress(totals)
+    totals['seconds'] = time.perf_counter() - started
+    return totals
@@ -0,0 +1,199 @@
+# core/async_views.py
+
+"""
+Async, read-only mirrors of the hottest GET endpoints, served under
+/api/async/ with the async ORM. Under an ASGI server (see README) a slow
+query no longer pins a worker thread, so one process can hold many more
+concurrent readers. Output matches the DRF views byte for byte in
+page-number mode; ?cursor= keyset paging and the catalogue cache stay on
+the regular endpoints.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Min
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import ClaimsJWTAuthentication
+from . import changes
+from .models import Book, Change
+from .pagination import KeysetPagination
+from .serializers import BookSerializer, LoanSerializer
+from .views import BookViewSet, LoanViewSet
+
+
+def json_response(data, status=200, headers=None):
+    # Same renderer as the DRF views, so bodies are identical
+    return HttpResponse(api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data), status=status,
+                        content_type='application/json', headers=headers)
+
+
+def error_response(exc):
+    headers = {'WWW-Authenticate': 'Bearer realm="api"'} if exc.status_code == 401 else {}
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = '%d' % exc.wait
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return json_response(detail, status=exc.status_code, headers=headers)
+
+
+def filtered(viewset_class, request, queryset, action):
+    # Reuses the viewset's filter backends, which only build the query
+    view = viewset_class(request=request, action=action, format_kwarg=None, kwargs={})
+    return view.filter_queryset(queryset)
+
+
+async def authenticate(request):
+    """
+    Resolves the JWT on `request` to a user, raising NotAuthenticated when
+    there is none. Tokens whose claims are trusted are resolved without
+    the database; other tokens fall back to the lookup in a worker thread.
+    """
+    authenticator = ClaimsJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    validated = authenticator.get_validated_token(raw_token)
+    if authenticator.trusts_claims(validated):
+        user = authenticator.get_user(validated)
+    else:
+        user = await sync_to_async(authenticator.get_user)(validated)
+    return user
+
+
+async def paginate(request, queryset, serializer_class):
+    """
+    Async equivalent of DRF's PageNumberPagination with the project's page
+    size settings: one COUNT and one LIMIT/OFFSET query.
+    """
+    paginator = KeysetPagination()
+    page_size = paginator.get_page_size(request)
+    count = await queryset.acount()
+    num_pages = max(1, -(-count // page_size))
+
+    page_param = request.query_params.get(paginator.page_query_param, 1)
+    if page_param in paginator.last_page_strings:
+        page_param = num_pages
+    try:
+        page = int(page_param)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid page.')
+    if page < 1 or page > num_pages:
+        raise NotFound('Invalid page.')
+
+    offset = (page - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, paginator.page_query_param, page + 1) if page < num_pages else None
+    if page == 1:
+        previous_link = None
+    elif page == 2:
+        previous_link = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous_link = replace_query_param(url, paginator.page_query_param, page - 1)
+    return {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': serializer_class(rows, many=True).data,
+    }
+
+
+async def book_list(request):
+    request = Request(request)
+    try:
+        queryset = filtered(BookViewSet, request, Book.objects.all(), 'list')
+        return json_response(await paginate(request, queryset, BookSerializer))
+    except APIException as exc:
+        return error_response(exc)
+
+
+async def book_detail(request, pk):
+    try:
+        book = await Book.objects.aget(pk=pk)
+    except Book.DoesNotExist:
+        return error_response(NotFound('No Book matches the given query.'))
+    return json_response(BookSerializer(book).data)
+
+
+async def my_loans(request):
+    request = Request(request)
+    try:
+        user = await authenticate(request)
+        request.user = user
+        queryset = LoanViewSet.queryset.filter(user_id=user.pk).order_by('-loan_date', '-id')
+        # ?user=/?book= filters validate their ids against the database
+        queryset = await sync_to_async(filtered)(LoanViewSet, request, queryset, 'my_loans')
+        return json_response(await paginate(request, queryset, LoanSerializer))
+    except APIException as exc:
+        return error_response(exc)
+
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+async def change_stream(request):
+    """
+    The change feed as server-sent events. Resumes from the Last-Event-ID
+    header that EventSource sends on reconnect, or ?since=; without either
+    it starts from now. Anonymous clients get book availability only.
+
+    Under ASGI the stream stays open for CHANGE_FEED_STREAM_SECONDS,
+    polling for new changes (one shared MAX(pk) per process per interval)
+    with comment heartbeats. Under WSGI, where an open stream would pin a
+    worker thread, each request is one long-poll: the events, if any, and
+    the end of the response, which EventSource simply reconnects after.
+    """
+    request = Request(request)
+    try:
+        try:
+            user = await authenticate(request)
+        except NotAuthenticated:
+            user = None
+        since = changes.parse_cursor(request.headers.get('Last-Event-ID') or request.query_params.get('since'))
+        if since is None:
+            since = await changes.alatest_sequence()
+        else:
+            changes.check_cursor(since, (await Change.objects.aaggregate(oldest=Min('pk')))['oldest'])
+    except APIException as exc:
+        return error_response(exc)
+
+    retry = f"retry: {int(changes.poll_interval() * 1000)}\n\n"
+    if not isinstance(request._request, ASGIRequest):
+        try:
+            events, since = await sync_to_async(changes.wait_for_changes)(user, since, settings.CHANGE_FEED_WAIT)
+        except APIException as exc:
+            return error_response(exc)
+        body = retry + ''.join(changes.sse_event(event) for event in events)
+        return HttpResponse(body, content_type='text/event-stream', headers=SSE_HEADERS)
+
+    async def stream(cursor):
+        yield retry
+        deadline = time.monotonic() + settings.CHANGE_FEED_STREAM_SECONDS
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            latest = await changes.alatest_sequence()
+            if latest > cursor:
+                events = await changes.achanges_since(user, cursor)
+                if events:
+                    cursor = events[-1]['seq']
+                    yield ''.join(changes.sse_event(event) for event in events)
+                    quiet_since = time.monotonic()
+                    continue
+                cursor = latest  # Nothing in between is visible to this user
+            if time.monotonic() - quiet_since >= settings.CHANGE_FEED_HEARTBEAT:
+                yield ': keep-alive\n\n'
+                quiet_since = time.monotonic()
+            await asyncio.sleep(changes.poll_interval())
+
+    return StreamingHttpResponse(stream(since), content_type='text/event-stream', headers=SSE_HEADERS)
+
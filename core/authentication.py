@@ -0,0 +1,168 @@
+# core/authentication.py
+
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import F
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .profiling import phase
+
+# Claims added to every token by LibraryTokenObtainPairSerializer
+CLAIM_FIELDS = ('is_staff', 'token_version')
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVersionLRU:
+    """
+    Bounded in-process map of user id -> latest token_version this process
+    has seen, holding only users whose tokens were revoked. It's a floor
+    under the shared cache, so a revocation made here holds even if the
+    shared entry is evicted; it never stands in for the shared cache.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            version = self._data.get(user_id)
+            if version is not None:
+                self._data.move_to_end(user_id)
+            return version
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._data[user_id] = version
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+revoked = TokenVersionLRU()
+
+
+def shared_cache():
+    """
+    The cache revoked token versions are published to, or None when
+    TOKEN_VERSION_CACHE_ALIAS is unset. Without one no worker hears about
+    another's revocations, so claims aren't trusted at all.
+    """
+    alias = getattr(settings, 'TOKEN_VERSION_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def warn_if_tokens_unshared():
+    """
+    Logs a warning when token claims can't be trusted across workers: with
+    no token version cache every request loads its user again, and with a
+    local-memory one a revocation, deactivation or is_staff change only
+    reaches the worker that made it.
+    """
+    alias = getattr(settings, 'TOKEN_VERSION_CACHE_ALIAS', None)
+    if not alias:
+        logger.warning(
+            'TOKEN_VERSION_CACHE_URL is not set; JWT claims are not trusted and every '
+            'authenticated request loads its user from the database.'
+        )
+    elif settings.CACHES[alias]['BACKEND'].endswith('.LocMemCache'):
+        logger.warning(
+            'The token version cache (%r) is local to each process; with more than one worker, '
+            'point TOKEN_VERSION_CACHE_URL at a shared cache or unset it.', alias,
+        )
+
+
+def version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def current_token_version(user_id):
+    """
+    Returns the known current token_version for a revoked/changed user, or
+    None when nothing has been revoked for them (their tokens are trusted).
+
+    The shared cache is read on every call: another worker may have revoked
+    again since this process last looked.
+    """
+    local, cache = revoked.get(user_id), shared_cache()
+    shared = cache.get(version_key(user_id)) if cache is not None else None
+    if shared is None or (local is not None and local >= shared):
+        return local
+    revoked.set(user_id, shared)
+    return shared
+
+
+def revoke_tokens(user):
+    """
+    Invalidates every token issued to `user` so far: bumps token_version in
+    the database and publishes the new version to the LRU and shared cache.
+    """
+    User = get_user_model()
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    version = User.objects.filter(pk=user.pk).values_list('token_version', flat=True).get()
+    user.token_version = version
+    revoked.set(user.pk, version)
+    cache = shared_cache()
+    if cache is not None:
+        # Older tokens are all expired once a refresh token's lifetime has passed
+        cache.set(version_key(user.pk), version, api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    return version
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the signed `user_id`, `is_staff` and
+    `token_version` claims instead of fetching the user on every request.
+
+    The user is materialized as a CustomUser with only those fields loaded,
+    so it works anywhere a real user does (FK assignment, filters); any
+    other attribute is lazily loaded from the database on first access.
+    Tokens without the claims (issued before this existed), and every
+    token while no shared TOKEN_VERSION_CACHE_ALIAS is configured, fall
+    back to the regular per-request lookup, which also checks is_active
+    and compares token_version with the database. Any save that changes
+    is_staff or is_active, or sets a new password, revokes the user's
+    tokens (core/signals.py), so a trusted claim is never staler than the
+    token_version check.
+    """
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+    def trusts_claims(self, validated_token):
+        return shared_cache() is not None and all(claim in validated_token for claim in CLAIM_FIELDS)
+
+    def get_user(self, validated_token):
+        if not self.trusts_claims(validated_token):
+            user = super().get_user(validated_token)
+            if validated_token.get('token_version', user.token_version) < user.token_version:
+                raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+            return user
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        token_version = validated_token['token_version']
+        current = current_token_version(user_id)
+        if current is not None and token_version < current:
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+        User = get_user_model()
+        return User.from_db(
+            None,
+            ['id', 'is_staff', 'is_active', 'token_version'],
+            [user_id, bool(validated_token['is_staff']), True, token_version],
+        )
@@ -0,0 +1,88 @@
+# core/bench/data.py
+
+import random
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Book, Loan
+
+User = get_user_model()
+
+GENRES = ['Fiction', 'History', 'Science', 'Poetry', 'Biography', 'Travel', 'Children', 'Reference']
+SEED_PREFIX = 'bench'
+SEED_ISBN_PREFIX = 'B'
+
+
+def seed(books, loans, users, batch_size=10000, stdout=None):
+    """
+    Inserts synthetic users, books and loans with raw executemany batches.
+    Rows are tagged with SEED_PREFIX/SEED_ISBN_PREFIX so reruns top up
+    instead of duplicating.
+    Loans are inserted directly because bulk_create would stamp every
+    loan_date with today's date (auto_now_add); they bypass the loan
+    counters, so run reconcile_stats --fix afterwards if those matter.
+    """
+    rng = random.Random(42)
+    today = date.today()
+    period = timedelta(days=settings.LOAN_PERIOD_DAYS)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    have_users = User.objects.filter(username__startswith=SEED_PREFIX).count()
+    User.objects.bulk_create(
+        [User(email=f'{SEED_PREFIX}{i}@example.com', username=f'{SEED_PREFIX}{i}') for i in range(have_users, users)],
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith=SEED_PREFIX).values_list('id', flat=True))
+
+    book_table = connection.ops.quote_name(Book._meta.db_table)
+    have_books = Book.objects.filter(isbn__startswith=SEED_ISBN_PREFIX).count()
+    for start in range(have_books, books, batch_size):
+        rows = [
+            (f'Title {i:07d}', f'Author {rng.randrange(books // 20 + 1)}', f'{SEED_ISBN_PREFIX}{i:012d}',
+             today - timedelta(days=rng.randrange(36500)), rng.choice(GENRES), rng.randrange(4), 0, now)
+            for i in range(start, min(start + batch_size, books))
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {book_table} (title, author, isbn, published_date, genre, available_copies, lifetime_loans, '
+                f'updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+        if stdout:
+            stdout.write(f'  books: {start + len(rows)}/{books}')
+    book_ids = list(Book.objects.filter(isbn__startswith=SEED_ISBN_PREFIX).values_list('id', flat=True))
+
+    loan_table = connection.ops.quote_name(Loan._meta.db_table)
+    have_loans = Loan.objects.filter(user__username__startswith=SEED_PREFIX).count()
+    for start in range(have_loans, loans, batch_size):
+        rows = []
+        for _ in range(min(batch_size, loans - start)):
+            loaned = today - timedelta(days=rng.randrange(3650))
+            # ~5% of loans are still open
+            returned = None if rng.random() < 0.05 else loaned + timedelta(days=rng.randrange(1, 60))
+            rows.append((rng.choice(user_ids), rng.choice(book_ids), loaned, loaned + period, returned, False, 0, now))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {loan_table} (user_id, book_id, loan_date, due_date, return_date, overdue, fine, updated_at) '
+                f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+        if stdout:
+            stdout.write(f'  loans: {start + len(rows)}/{loans}')
+    return user_ids, book_ids
+
+
+BENCH_PASSWORD = 'BenchPassword123!'
+
+
+def set_bench_passwords(password=BENCH_PASSWORD):
+    """
+    Gives every seeded user the same password with a single UPDATE; hashing
+    it once per user would take minutes at realistic volumes.
+    """
+    return User.objects.filter(username__startswith=SEED_PREFIX).update(password=make_password(password))
@@ -0,0 +1,58 @@
+# core/bench/report.py
+
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.db import connection
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results, transport, rows):
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'transport': transport,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'rows': rows,
+        },
+        'results': results,
+    }
+
+
+def load_report(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(report, baseline):
+    """
+    Yields (scenario, concurrency, throughput change %, p95 change %) for
+    every run present in both reports.
+    """
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if new is not None and old else None
+
+    previous = {(run['scenario'], run['concurrency']): run for run in baseline['results']}
+    for run in report['results']:
+        old = previous.get((run['scenario'], run['concurrency']))
+        if old is None or not run['latency_ms'] or not old['latency_ms']:
+            continue
+        yield (run['scenario'], run['concurrency'],
+               change(run['throughput_rps'], old['throughput_rps']),
+               change(run['latency_ms']['p95'], old['latency_ms']['p95']))
@@ -0,0 +1,161 @@
+# core/bench/runner.py
+
+import http.client
+import json
+import logging
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+
+class InProcessTransport:
+    """
+    Sends requests through Django's full handler and middleware stack in
+    this process, counting the SQL queries each one runs.
+    """
+    def __init__(self):
+        self.client = Client(raise_request_exception=False, HTTP_HOST='localhost')
+
+    def request(self, method, path, body=None, headers=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.generic(
+                method, path, json.dumps(body) if body is not None else '',
+                content_type='application/json', headers=headers,
+            )
+        return response.status_code, len(ctx.captured_queries)
+
+    def close(self):
+        connection.close()
+
+
+class ViewTransport:
+    """
+    Calls one view directly, skipping URL routing and middleware, as `user`
+    when given: for timing a view's own work (serializers, renderers) in
+    isolation. Counts SQL queries like InProcessTransport.
+    """
+    def __init__(self, view, user=None):
+        self.view, self.user = view, user
+        self.factory = APIRequestFactory()
+
+    def request(self, method, path, body=None, headers=None):
+        request = self.factory.generic(
+            method, path, json.dumps(body) if body is not None else '',
+            content_type='application/json', headers=headers, HTTP_HOST='localhost',
+        )
+        if self.user is not None:
+            force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.view(request)
+            response.render()
+        return response.status_code, len(ctx.captured_queries)
+
+    def close(self):
+        connection.close()
+
+
+class HTTPTransport:
+    """
+    Sends requests to a running server over one keep-alive connection.
+    Query counts aren't visible from here, so they are reported as None.
+    """
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status, None
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            return 0, None
+
+    def close(self):
+        self.connection.close()
+
+
+@contextmanager
+def quiet_request_log():
+    """
+    Failed requests are counted in the results; this keeps Django from
+    also logging a traceback for each one.
+    """
+    request_logger = logging.getLogger('django.request')
+    previous_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        request_logger.setLevel(previous_level)
+
+
+def run_load(scenario, make_transport, concurrency, requests):
+    """
+    Runs `requests` scenario steps split across `concurrency` threads, each
+    with its own transport (and so its own connection), and returns the
+    summary dict for the run.
+    """
+    samples, lock = [], threading.Lock()
+    gate = threading.Barrier(concurrency + 1, timeout=60)
+    quotas = [requests // concurrency + (worker < requests % concurrency) for worker in range(concurrency)]
+
+    def worker(index):
+        transport = make_transport()
+        mine = []
+        try:
+            steps = scenario.steps(index)
+            gate.wait()
+            for _ in range(quotas[index]):
+                method, path, body, headers = next(steps)
+                started = time.perf_counter()
+                status, queries = transport.request(method, path, body, headers)
+                mine.append(((time.perf_counter() - started) * 1000, status, queries))
+        finally:
+            transport.close()
+            with lock:
+                samples.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(scenario.name, concurrency, samples, elapsed)
+
+
+def summarize(name, concurrency, samples, elapsed):
+    latencies = sorted(sample[0] for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not 200 <= sample[1] < 400),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': round(cuts[49], 3), 'p95': round(cuts[94], 3), 'p99': round(cuts[98], 3),
+            'mean': round(statistics.fmean(latencies), 3), 'max': round(latencies[-1], 3),
+        } if latencies else None,
+        'queries_per_request': {
+            'mean': round(statistics.fmean(queries), 2), 'max': max(queries),
+        } if queries else None,
+    }
@@ -0,0 +1,118 @@
+# core/bench/scenarios.py
+
+import random
+
+from django.contrib.auth import get_user_model
+
+from core.models import Book
+from core.serializers import LibraryTokenObtainPairSerializer
+
+from .data import BENCH_PASSWORD, SEED_PREFIX
+
+User = get_user_model()
+
+
+class BenchContext:
+    """
+    Users (with access tokens) and books the scenarios act on. Each worker
+    gets its own user and its own borrowable book, so workers don't contend
+    for the same copy.
+    """
+    def __init__(self, workers):
+        users = list(User.objects.filter(username__startswith=SEED_PREFIX).order_by('id')[:workers])
+        if not users:
+            raise ValueError('No seeded users; run the benchmark without --skip-seed first.')
+        self.users = [
+            (user.email, str(LibraryTokenObtainPairSerializer.get_token(user).access_token)) for user in users
+        ]
+        self.book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:1000])
+        self.book_pages = max(1, min(50, Book.objects.count() // 20))
+        self.borrowable = list(
+            Book.objects.filter(available_copies__gt=0).order_by('id').values_list('id', flat=True)[:workers]
+        )
+
+    def user(self, worker):
+        return self.users[worker % len(self.users)]
+
+    def auth(self, worker):
+        return {'Authorization': f'Bearer {self.user(worker)[1]}'}
+
+
+class Scenario:
+    name = None
+    description = ''
+
+    def __init__(self, context):
+        self.context = context
+
+    def steps(self, worker):
+        """
+        Endless generator of (method, path, body, headers) for one worker.
+        """
+        raise NotImplementedError
+
+
+class FixedRequest(Scenario):
+    """
+    The same request over and over, from every worker.
+    """
+    def __init__(self, name, path, headers=None, method='GET', body=None):
+        self.name, self.path, self.headers, self.method, self.body = name, path, headers, method, body
+
+    def steps(self, worker):
+        while True:
+            yield self.method, self.path, self.body, self.headers
+
+
+class BookList(Scenario):
+    name = 'books'
+    description = 'Anonymous GET /api/books/ over varied pages and orderings'
+
+    def steps(self, worker):
+        rng = random.Random(worker)
+        while True:
+            ordering = rng.choice(['title', '-published_date', 'author'])
+            yield 'GET', f'/api/books/?page_size=20&page={rng.randint(1, self.context.book_pages)}&ordering={ordering}', None, None
+
+
+class BookDetail(Scenario):
+    name = 'book_detail'
+    description = 'Anonymous GET /api/books/<id>/'
+
+    def steps(self, worker):
+        rng = random.Random(worker)
+        while True:
+            yield 'GET', f'/api/books/{rng.choice(self.context.book_ids)}/', None, None
+
+
+class LoanList(Scenario):
+    name = 'loans'
+    description = "GET /api/loans/ as a regular user (their own loans)"
+
+    def steps(self, worker):
+        while True:
+            yield 'GET', '/api/loans/?page_size=20', None, self.context.auth(worker)
+
+
+class Token(Scenario):
+    name = 'token'
+    description = 'POST /api/token/ with email and password (password hashing bound)'
+
+    def steps(self, worker):
+        body = {'email': self.context.user(worker)[0], 'password': BENCH_PASSWORD}
+        while True:
+            yield 'POST', '/api/token/', body, None
+
+
+class BorrowReturn(Scenario):
+    name = 'borrow_return'
+    description = 'Alternating POST /api/books/<id>/borrow/ and /return/ on a per-worker book'
+
+    def steps(self, worker):
+        book_id = self.context.borrowable[worker % len(self.context.borrowable)]
+        while True:
+            yield 'POST', f'/api/books/{book_id}/borrow/', None, self.context.auth(worker)
+            yield 'POST', f'/api/books/{book_id}/return/', None, self.context.auth(worker)
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (BookList, BookDetail, LoanList, Token, BorrowReturn)}
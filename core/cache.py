@@ -0,0 +1,166 @@
+# core/cache.py
+
+import hashlib
+import json
+import logging
+import threading
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import current_replica, is_pinned
+
+VERSION_KEY = 'catalogue:version'
+
+logger = logging.getLogger(__name__)
+
+
+def catalogue_cache():
+    return caches[getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')]
+
+
+def warn_if_process_local():
+    """
+    Logs a warning when the catalogue cache is local memory: a borrow in
+    one worker can't invalidate another's entries, which then serve stale
+    available_copies (and ETags) for up to CATALOGUE_CACHE_TIMEOUT.
+    """
+    alias = getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')
+    if settings.CACHES[alias]['BACKEND'].endswith('.LocMemCache'):
+        logger.warning(
+            'The catalogue cache (%r) is local to each process; with more than one worker, '
+            'point CATALOGUE_CACHE_URL at a shared cache or set it to dummy://.', alias,
+        )
+
+
+class CacheStats:
+    """
+    In-process hit/miss/not-modified counters for the catalogue cache.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def record(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else None
+        return counts
+
+
+stats = CacheStats()
+
+
+def get_catalogue_version():
+    cache = catalogue_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalogue_version():
+    """
+    Invalidates every cached catalogue response at once by moving to a new
+    version; stale entries simply stop being read and age out.
+    """
+    cache = catalogue_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (first write or evicted): start a fresh version
+        cache.add(VERSION_KEY, 1, timeout=None)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass  # DummyCache never stores anything
+
+
+def invalidate_catalogue():
+    """
+    Bumps the version now, and again once the current transaction commits:
+    a reader that cached pre-commit rows under the interim version is
+    discarded by the second bump.
+    """
+    bump_catalogue_version()
+    transaction.on_commit(bump_catalogue_version)
+
+
+def response_key(request, action, kwargs):
+    # Query params are sorted so ?a=1&b=2 and ?b=2&a=1 share an entry; host
+    # and renderer are included because pagination links and output differ
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    raw = '|'.join([
+        request.get_host(), action, json.dumps(kwargs, sort_keys=True),
+        params, request.accepted_renderer.format or '',
+    ])
+    return f'catalogue:{get_catalogue_version()}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def compute_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.md5(body.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in candidates or '*' in candidates
+
+
+class CatalogueCacheMixin:
+    """
+    Caches list/retrieve responses per normalized query, under the current
+    catalogue version, and answers If-None-Match with 304 Not Modified.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = catalogue_cache()
+        key = response_key(request, self.action, kwargs)
+        # A user pinned to the primary after their own write must not be
+        # served an entry filled from a lagging replica
+        entry = None if is_pinned(request) else cache.get(key)
+        if entry is not None:
+            data, etag = entry
+            outcome = 'hits'
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data, etag = response.data, compute_etag(response.data)
+            timeout = getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 300)
+            if current_replica() is not None:
+                # Replica rows may predate the last version bump; let them age out quickly
+                timeout = min(timeout, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+            cache.set(key, (data, etag), timeout)
+            outcome = 'misses'
+        stats.record(outcome)
+
+        if etag_matches(request, etag):
+            stats.record('not_modified')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['X-Cache'] = 'HIT' if outcome == 'hits' else 'MISS'
+        return response
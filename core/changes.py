@@ -0,0 +1,255 @@
+# core/changes.py
+
+"""
+The change feed. Every committed write that alters a book's availability
+or a loan appends a Change row; its auto-increment primary key is the
+sequence number clients resume from, by long-poll (GET /api/changes/) or
+as server-sent events (GET /api/changes/stream/, best under ASGI).
+
+Rows are written in the same transaction as the change they describe,
+so a rolled-back write never shows up and a committed one is never lost,
+and they carry the state *after* the write (e.g. the current
+available_copies) rather than a delta: replaying any suffix of the feed,
+or an event twice, still converges on the right state.
+"""
+
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Book, Change
+
+# Woken when this process records changes, so its long-polls return at
+# once; changes from other processes are picked up every
+# CHANGE_FEED_POLL_INTERVAL seconds
+_changed = threading.Condition()
+_latest = {'seq': None, 'checked': 0.0}
+# Caps the long-polls of this process that are asleep waiting for changes
+_waiters_lock = threading.Lock()
+_waiters = {'slots': None}
+FEED_LOCK_ID = 0x6c69622d6665  # Arbitrary advisory lock key for Change inserts
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'This cursor is older than the retained change history; reload and start from a new cursor.'
+    default_code = 'cursor_expired'
+
+
+class FeedBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many clients are waiting for changes, please retry shortly.'
+    default_code = 'feed_busy'
+    wait = 1  # DRF turns this into a Retry-After header
+
+
+def parse_cursor(value):
+    if value in (None, ''):
+        return None
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        since = -1
+    if since < 0:
+        raise ValidationError({'since': ['A valid non-negative integer is required.']})
+    return since
+
+
+def poll_interval():
+    return getattr(settings, 'CHANGE_FEED_POLL_INTERVAL', 1.0)
+
+
+def books_changed(book_ids):
+    """
+    Records the availability of each book as the current transaction sees
+    it, i.e. after its own UPDATEs.
+    """
+    record(book_entries(book_ids))
+
+
+def loans_changed(loans, deleted=False):
+    record(loan_entries(loans, deleted))
+
+
+def book_entries(book_ids, copies=None):
+    """
+    Change rows for the given books; `copies` ({book_id: available_copies})
+    saves the lookup when the caller already knows the new values.
+    """
+    book_ids = {int(pk) for pk in book_ids}  # URL kwargs arrive as strings
+    if copies is None and book_ids:
+        copies = dict(Book.objects.filter(pk__in=book_ids).values_list('pk', 'available_copies'))
+    return [
+        Change(kind=Change.BOOK, object_id=pk,
+               data={'available_copies': copies[pk]} if pk in copies else {'deleted': True})
+        for pk in sorted(book_ids)
+    ]
+
+
+def loan_entries(loans, deleted=False):
+    return [
+        Change(kind=Change.LOAN, object_id=loan.pk, user_id=loan.user_id, data=loan_state(loan, deleted))
+        for loan in loans
+    ]
+
+
+def loan_state(loan, deleted=False):
+    if deleted:
+        return {'book': loan.book_id, 'deleted': True}
+    return {
+        'book': loan.book_id,
+        'loan_date': loan.loan_date.isoformat() if loan.loan_date else None,
+        'return_date': loan.return_date.isoformat() if loan.return_date else None,
+    }
+
+
+def record(entries):
+    if not entries:
+        return
+    if connection.vendor == 'postgresql':
+        # Sequence values are handed out before commit, so two writers could
+        # commit out of order and a reader between them would skip the
+        # lower one. Holding this lock until commit keeps the order.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [FEED_LOCK_ID])
+    Change.objects.bulk_create(entries)
+    transaction.on_commit(lambda: notify(entries[-1].pk))
+
+
+def notify(seq):
+    with _changed:
+        if seq is not None:
+            _latest['seq'] = max(_latest['seq'] or 0, seq)
+        _changed.notify_all()
+
+
+def visible_to(user):
+    """
+    Book changes are public; loan changes are shown to their borrower and
+    to staff.
+    """
+    if user is not None and user.is_staff:
+        return Q()
+    if user is None or not user.is_authenticated:
+        return Q(kind=Change.BOOK)
+    return Q(kind=Change.BOOK) | Q(user_id=user.pk)
+
+
+def as_event(row):
+    return {'seq': row['pk'], 'type': row['kind'], 'id': row['object_id'], 'data': row['data']}
+
+
+def sse_event(event):
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+def since_query(user, since, limit=None):
+    limit = limit or getattr(settings, 'CHANGE_FEED_BATCH', 200)
+    return (
+        Change.objects.filter(visible_to(user), pk__gt=since)
+        .order_by('pk').values('pk', 'kind', 'object_id', 'data')[:limit]
+    )
+
+
+def changes_since(user, since, limit=None):
+    return [as_event(row) for row in since_query(user, since, limit)]
+
+
+async def achanges_since(user, since, limit=None):
+    return [as_event(row) async for row in since_query(user, since, limit)]
+
+
+def cached_latest():
+    # The newest sequence seen by this process, if checked recently enough
+    if _latest['seq'] is not None and time.monotonic() - _latest['checked'] < poll_interval():
+        return _latest['seq']
+    return None
+
+
+def remember_latest(seq):
+    with _changed:
+        _latest['seq'] = seq or 0
+        _latest['checked'] = time.monotonic()
+        return _latest['seq']
+
+
+def latest_sequence():
+    """
+    The newest sequence number. Waiting clients share one MAX(pk) lookup
+    per process per poll interval instead of each querying for changes.
+    """
+    seq = cached_latest()
+    if seq is None:
+        seq = remember_latest(Change.objects.aggregate(seq=Max('pk'))['seq'])
+    return seq
+
+
+async def alatest_sequence():
+    seq = cached_latest()
+    if seq is None:
+        seq = remember_latest((await Change.objects.aaggregate(seq=Max('pk')))['seq'])
+    return seq
+
+
+def check_cursor(since, oldest):
+    # Rows up to `oldest` were pruned: the client missed changes
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired()
+
+
+def waiter_slots():
+    with _waiters_lock:
+        if _waiters['slots'] is None:
+            _waiters['slots'] = threading.BoundedSemaphore(getattr(settings, 'CHANGE_FEED_MAX_WAITERS', 8))
+        return _waiters['slots']
+
+
+@receiver(setting_changed)
+def reset_waiter_slots(*, setting, **kwargs):
+    if setting == 'CHANGE_FEED_MAX_WAITERS':
+        with _waiters_lock:
+            _waiters['slots'] = None
+
+
+def wait_for_changes(user, since, timeout):
+    """
+    Long-poll: returns (events, cursor) as soon as there are changes after
+    `since` visible to `user`, or ([], cursor) after `timeout` seconds.
+
+    Changes already there are returned at once. Waiting for new ones holds
+    the request's thread, so at most CHANGE_FEED_MAX_WAITERS requests per
+    process wait; past that, FeedBusy (503 + Retry-After).
+    """
+    check_cursor(since, Change.objects.aggregate(oldest=Min('pk'))['oldest'])
+    deadline = time.monotonic() + timeout
+    slots = None
+    try:
+        while True:
+            latest = latest_sequence()
+            if latest > since:
+                events = changes_since(user, since)
+                if events:
+                    return events, events[-1]['seq']
+                since = latest  # Nothing in between is visible to this user
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return [], since
+            if slots is None:
+                candidate = waiter_slots()
+                if not candidate.acquire(blocking=False):
+                    raise FeedBusy()
+                slots = candidate
+            with _changed:
+                _changed.wait(min(poll_interval(), remaining))
+    finally:
+        if slots is not None:
+            slots.release()
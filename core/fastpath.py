@@ -0,0 +1,91 @@
+# core/fastpath.py
+
+"""
+Fast path for read-heavy list endpoints. A ValuesSerializer reads the
+field layout of a regular DRF serializer once, fetches rows with
+`.values()` and builds the output dicts directly, skipping model
+instances and per-field to_representation calls. The output is the same
+data, key for key, so responses stay byte-identical.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .profiling import phase
+from .sparse import ordering_columns
+
+# Fields whose to_representation is the identity (or int()/str() of what
+# the database returns already), so raw column values can be passed through
+PASSTHROUGH_FIELDS = (
+    serializers.ReadOnlyField, serializers.CharField, serializers.IntegerField,
+    serializers.BooleanField, serializers.PrimaryKeyRelatedField,
+)
+
+
+def date_isoformat(value):
+    return value.isoformat()
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of `serializer`: (output key, values() lookup, convert)
+    for each readable field, in the serializer's order; `convert` is None
+    when the column value is passed through as is.
+    """
+    def __init__(self, serializer):
+        self.columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.DateField):
+                if getattr(field, 'format', api_settings.DATE_FORMAT) not in (None, ISO_8601):
+                    raise ImproperlyConfigured(f'{name}: only ISO 8601 dates have a fast path.')
+                convert = date_isoformat
+            elif isinstance(field, serializers.DecimalField):
+                convert = field.to_representation  # Quantizing and str() are per value anyway
+            elif isinstance(field, PASSTHROUGH_FIELDS) and getattr(field, 'pk_field', None) is None:
+                convert = None
+            else:
+                raise ImproperlyConfigured(f'{name}: {type(field).__name__} has no fast path.')
+            self.columns.append((name, '__'.join(field.source_attrs), convert))
+
+    def values(self, queryset, extra=()):
+        # `extra` columns ride along unserialized, e.g. keys for keyset paging
+        return queryset.values(*dict.fromkeys([*(lookup for _, lookup, _ in self.columns), *extra]))
+
+    def to_representation(self, rows):
+        with phase('serialize'):
+            fields = [(name, lookup) for name, lookup, _ in self.columns]
+            converted = [(name, convert) for name, _, convert in self.columns if convert is not None]
+            data = [{name: row[lookup] for name, lookup in fields} for row in rows]
+            # Reassigning an existing key keeps the serializer's key order
+            for item in data:
+                for name, convert in converted:
+                    if item[name] is not None:
+                        item[name] = convert(item[name])
+            return data
+
+
+class ValuesListMixin:
+    """
+    Serves `list` through a ValuesSerializer built from the view's
+    serializer (when FAST_LIST_SERIALIZERS is on); everything else, and
+    every write, still goes through the regular serializer.
+    """
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+        fast = ValuesSerializer(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        # Keyset pagination reads the ordering keys from each row
+        rows = fast.values(queryset, extra=['id', *ordering_columns(self, request, queryset)])
+        # COUNT(*) over the values() query would keep the joins its related
+        # columns need; the model queryset counts the same rows without them
+        rows.count = queryset.count
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+        return Response(fast.to_representation(rows))
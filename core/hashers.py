@@ -0,0 +1,154 @@
+# core/hashers.py
+
+"""
+Password hashers selected by settings.PASSWORD_HASHER, with their cost
+parameters taken from settings, and with the hashing itself run on a
+bounded pool (PASSWORD_HASH_WORKERS threads or processes). The pool caps
+how many hashes burn CPU at once, so a registration/login burst queues
+instead of starving every other request; past PASSWORD_HASH_QUEUE waiting
+hashes, requests get a 503 with Retry-After (core.middleware maps it for
+non-DRF views such as the admin login).
+
+The request thread still blocks on its hash's result: the pool limits
+hashing concurrency, it does not free the worker while a hash runs.
+
+Existing hashes keep verifying through the non-preferred hashers, and
+Django rehashes them with the preferred one on the user's next login.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher, get_hashers, get_hashers_by_algorithm,
+)
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_lock = threading.Lock()
+_local = threading.local()
+_pool = None
+_slots = None
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, please retry shortly.'
+    default_code = 'hashing_busy'
+    wait = 1  # DRF turns this into a Retry-After header
+
+
+def hash_pool():
+    """
+    Returns (executor, slots), creating them on first use, or (None, None)
+    when offloading is disabled (PASSWORD_HASH_WORKERS=0).
+    """
+    global _pool, _slots
+    workers = getattr(settings, 'PASSWORD_HASH_WORKERS', 0)
+    if not workers:
+        return None, None
+    with _lock:
+        if _pool is None:
+            if getattr(settings, 'PASSWORD_HASH_POOL', 'thread') == 'process':
+                _pool = ProcessPoolExecutor(
+                    workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_process
+                )
+            else:
+                _pool = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(workers + getattr(settings, 'PASSWORD_HASH_QUEUE', 64))
+        return _pool, _slots
+
+
+@receiver(setting_changed)
+def reset_hash_pool(*, setting, **kwargs):
+    global _pool, _slots
+    if setting.startswith('PASSWORD_HASH_'):
+        with _lock:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = _slots = None
+    if setting.startswith(('SCRYPT_', 'ARGON2_')):
+        # Hasher instances read their cost settings when created
+        get_hashers.cache_clear()
+        get_hashers_by_algorithm.cache_clear()
+
+
+def _init_process():
+    import django
+    django.setup()
+
+
+def _run_direct(hasher, method, *args, **kwargs):
+    # Calls the hasher's own implementation (the class after the mixin in
+    # the MRO); nested calls, e.g. verify() -> encode(), stay on this thread
+    previous, _local.direct = getattr(_local, 'direct', False), True
+    try:
+        return getattr(super(PooledHasherMixin, hasher), method)(*args, **kwargs)
+    finally:
+        _local.direct = previous
+
+
+def _run_in_process(hasher_path, method, *args, **kwargs):
+    return _run_direct(import_string(hasher_path)(), method, *args, **kwargs)
+
+
+def offload(hasher, method, *args, **kwargs):
+    pool, slots = (None, None) if getattr(_local, 'direct', False) else hash_pool()
+    if pool is None:
+        return _run_direct(hasher, method, *args, **kwargs)
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        if isinstance(pool, ProcessPoolExecutor):
+            hasher_path = f'{type(hasher).__module__}.{type(hasher).__qualname__}'
+            future = pool.submit(_run_in_process, hasher_path, method, *args, **kwargs)
+        else:
+            future = pool.submit(_run_direct, hasher, method, *args, **kwargs)
+        return future.result()
+    finally:
+        slots.release()
+
+
+class PooledHasherMixin:
+    """
+    Runs encode() and verify() on the bounded hashing pool.
+    """
+    def encode(self, password, salt, *args, **kwargs):
+        return offload(self, 'encode', password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return offload(self, 'verify', password, encoded)
+
+
+class PooledPBKDF2PasswordHasher(PooledHasherMixin, PBKDF2PasswordHasher):
+    """
+    Django's default PBKDF2-SHA256, unchanged except for running on the pool.
+    """
+
+
+class TunedScryptPasswordHasher(PooledHasherMixin, ScryptPasswordHasher):
+    """
+    scrypt (stdlib hashlib, memory-hard) with SCRYPT_* cost settings.
+    """
+    def __init__(self):
+        self.work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', self.work_factor)
+        self.block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', self.block_size)
+        self.parallelism = getattr(settings, 'SCRYPT_PARALLELISM', self.parallelism)
+        # hashlib's default 32 MiB cap rejects larger work factors
+        self.maxmem = 2 * 128 * self.work_factor * self.block_size
+
+
+class TunedArgon2PasswordHasher(PooledHasherMixin, Argon2PasswordHasher):
+    """
+    Argon2id with ARGON2_* cost settings; needs the argon2-cffi package.
+    """
+    def __init__(self):
+        self.time_cost = getattr(settings, 'ARGON2_TIME_COST', self.time_cost)
+        self.memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', self.memory_cost)
+        self.parallelism = getattr(settings, 'ARGON2_PARALLELISM', self.parallelism)
+
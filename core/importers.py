@@ -0,0 +1,92 @@
+# core/importers.py
+
+from collections import defaultdict
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from . import changes
+from .cache import invalidate_catalogue
+from .models import Book
+from .search import index_book_queryset
+from .serializers import BookImportSerializer
+
+# Columns an import may overwrite on an existing book, when the row has
+# them. available_copies is only used for new books: on an existing one it
+# counts the copies on the shelf, and loans (core.loans) own that number.
+UPSERT_FIELDS = ['title', 'author', 'published_date', 'genre']
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_books(rows, batch_size=1000):
+    """
+    Validates and upserts books from an iterable of (line_number, row) pairs
+    (see core.parsers). Each batch costs one ISBN lookup, one
+    INSERT ... ON CONFLICT (isbn) DO UPDATE and its own transaction, so a bad
+    row or batch never aborts the rest of the import.
+
+    Existing books only get the UPSERT_FIELDS the row supplies; a column
+    missing from the file (or an empty CSV cell) leaves the stored value
+    alone. Rows are grouped by the columns they supply, one upsert each.
+
+    Returns {'created', 'updated', 'failed', 'errors': [{'line', 'errors'}]}.
+    When an ISBN repeats within a batch the last row wins. A body that turns
+    out to be undecodable part-way (core.parsers raises ParseError) stops
+    the import; batches before it stay committed.
+    """
+    report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    # One serializer for every row: building ModelSerializer fields is the
+    # expensive part, run_validation() itself keeps no per-row state
+    validator = BookImportSerializer()
+
+    for batch in batched(rows, batch_size):
+        valid = {}
+        for line, row in batch:
+            if row is None:
+                report['failed'] += 1
+                report['errors'].append({'line': line, 'errors': {'non_field_errors': ['Malformed row.']}})
+                continue
+            try:
+                data = validator.run_validation(row)
+            except ValidationError as exc:
+                report['failed'] += 1
+                report['errors'].append({'line': line, 'errors': as_serializer_error(exc)})
+                continue
+            valid[data['isbn']] = data
+        if not valid:
+            continue
+
+        try:
+            with transaction.atomic():
+                existing = set(Book.objects.filter(isbn__in=valid).values_list('isbn', flat=True))
+                groups = defaultdict(list)
+                for data in valid.values():
+                    groups[tuple(name for name in UPSERT_FIELDS if name in data)].append(Book(**data))
+                for supplied, books in groups.items():
+                    Book.objects.bulk_create(
+                        books,
+                        update_conflicts=True,
+                        unique_fields=['isbn'],
+                        update_fields=[*supplied, 'updated_at'],
+                    )
+                # bulk_create bypasses the post_save signal that feeds search
+                index_book_queryset(Book.objects.filter(isbn__in=valid))
+                invalidate_catalogue()
+                changes.books_changed(Book.objects.filter(isbn__in=valid).values_list('pk', flat=True))
+        except DatabaseError as exc:
+            # Keep going with the next batch; report the whole batch as failed
+            report['errors'].append({'line': batch[0][0], 'errors': {'non_field_errors': [f'Batch failed: {exc}']}})
+            report['failed'] += len(valid)
+            continue
+
+        report['updated'] += len(existing)
+        report['created'] += len(valid) - len(existing)
+
+    return report
@@ -0,0 +1,294 @@
+# core/loans.py
+
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from . import changes, stats
+from .cache import invalidate_catalogue
+from .models import Book, Hold, Loan
+from .sqlite import serialized_write
+
+UNAVAILABLE_MESSAGE = 'This book is currently not available.'
+
+
+def take_copy(book_id):
+    """
+    Decrements available_copies with a single conditional UPDATE, counting
+    the loan towards lifetime_loans in the same statement.
+
+    The `available_copies > 0` guard is evaluated by the database while it
+    holds the row lock, so concurrent borrowers can never oversell a book.
+    Must be called inside a transaction; the caller records the change
+    feed entries (core.changes) together with its loan's.
+    """
+    updated = Book.objects.filter(pk=book_id, available_copies__gt=0).update(
+        available_copies=F('available_copies') - 1,
+        lifetime_loans=F('lifetime_loans') + 1,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        if not Book.objects.filter(pk=book_id).exists():
+            raise NotFound('Book not found.')
+        raise ValidationError({'book': [UNAVAILABLE_MESSAGE]})
+    invalidate_catalogue()
+
+
+def put_back_copy(book_id):
+    """
+    Puts a returned copy back: to the oldest waiting hold if there is one,
+    otherwise onto the shelf with an in-place increment (no read-modify-write).
+    Must be called inside a transaction.
+    """
+    if promote_holds(Counter({book_id: 1})):
+        Book.objects.filter(pk=book_id).update(available_copies=F('available_copies') + 1, updated_at=timezone.now())
+    invalidate_catalogue()
+
+
+def promote_holds(returned):
+    """
+    Hands up to n returned copies of each book ({book_id: n}) to its oldest
+    waiting holds, creating their loans, and returns a Counter of copies
+    left over for the shelf. Must be called inside a transaction.
+
+    The book rows are locked first (in primary-key order), which serializes
+    promotion with place_hold: a hold can't slip in between the queue
+    check and a copy landing on the shelf.
+    """
+    list(Book.objects.select_for_update().filter(pk__in=returned).order_by('pk').values_list('pk'))
+    promoted, left = [], Counter()
+    for book_id, n in sorted(returned.items()):
+        heads = list(Hold.objects.filter(book_id=book_id, fulfilled_at__isnull=True).order_by('created', 'id')[:n])
+        promoted += heads
+        if n > len(heads):
+            left[book_id] = n - len(heads)
+    if promoted:
+        new_loans = Loan.objects.bulk_create([Loan(user_id=hold.user_id, book_id=hold.book_id) for hold in promoted])
+        now = timezone.now()
+        for hold, loan in zip(promoted, new_loans):
+            hold.loan, hold.fulfilled_at = loan, now
+        Hold.objects.bulk_update(promoted, ['loan', 'fulfilled_at'])
+        handed_out = Counter(hold.book_id for hold in promoted)
+        Book.objects.filter(pk__in=handed_out).update(
+            lifetime_loans=F('lifetime_loans') + stats.per_row(handed_out), updated_at=now
+        )
+        stats.loans_opened(new_loans)
+        changes.loans_changed(new_loans)
+    return left
+
+
+@serialized_write
+def borrow_book(user, book_id):
+    """
+    Creates a Loan for `user` and takes one copy of the book, atomically.
+    """
+    with transaction.atomic():
+        take_copy(book_id)
+        loan = Loan.objects.create(user=user, book_id=book_id)
+        stats.loan_opened(loan)
+        changes.record(changes.book_entries([book_id]) + changes.loan_entries([loan]))
+        return loan
+
+
+@serialized_write
+def return_book(user, book_id):
+    """
+    Closes the user's oldest open loan for the book and puts the copy back.
+    """
+    with transaction.atomic():
+        loan = (
+            Loan.objects.select_for_update()
+            .filter(user=user, book_id=book_id, return_date__isnull=True)
+            .order_by('loan_date', 'id')
+            .first()
+        )
+        if loan is None:
+            raise NotFound('You have no active loan for this book.')
+
+        # Conditional update so two concurrent returns can't both credit a copy
+        loan.return_date = timezone.localdate()
+        closed = Loan.objects.filter(pk=loan.pk, return_date__isnull=True).update(
+            return_date=loan.return_date, updated_at=timezone.now()
+        )
+        if not closed:
+            raise NotFound('You have no active loan for this book.')
+        put_back_copy(book_id)
+        stats.loan_closed(loan)
+        changes.record(changes.book_entries([book_id]) + changes.loan_entries([loan]))
+        return loan
+
+
+BULK_LIMIT = 200
+
+
+def resolve_books(items):
+    """
+    Maps each requested item to a book id: integers are ids, strings are
+    ISBNs. One query for the whole list; unknown items map to None.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValidationError({'books': ['Expected a non-empty list of book ids or ISBNs.']})
+    if len(items) > BULK_LIMIT:
+        raise ValidationError({'books': [f'At most {BULK_LIMIT} books per request.']})
+    if any(isinstance(item, bool) or not isinstance(item, (int, str)) for item in items):
+        raise ValidationError({'books': ['Each item must be a book id (integer) or an ISBN (string).']})
+    ids = {item for item in items if isinstance(item, int)}
+    isbns = {item for item in items if isinstance(item, str)}
+
+    by_id, by_isbn = set(), {}
+    for pk, isbn in Book.objects.filter(Q(pk__in=ids) | Q(isbn__in=isbns)).values_list('pk', 'isbn'):
+        if pk in ids:
+            by_id.add(pk)
+        by_isbn[isbn] = pk
+    return [(item if item in by_id else None) if isinstance(item, int) else by_isbn.get(item) for item in items]
+
+
+def item_result(item, book_id, status, loan=None, detail=None):
+    result = {'item': item, 'book': book_id, 'status': status}
+    if loan is not None:
+        result['loan'] = loan.pk
+    if detail is not None:
+        result['detail'] = detail
+    return result
+
+
+@serialized_write
+def bulk_borrow(user, items):
+    """
+    Borrows every requested book for `user` in one transaction and returns
+    a result per item; unavailable or unknown books don't fail the others.
+
+    Book rows are locked in primary-key order, the same order every bulk
+    operation uses, so two overlapping carts can't deadlock.
+    """
+    book_ids = resolve_books(items)
+    with transaction.atomic():
+        available = dict(
+            Book.objects.select_for_update().filter(pk__in={pk for pk in book_ids if pk})
+            .order_by('pk').values_list('pk', 'available_copies')
+        )
+        taken, outcomes = Counter(), []
+        for item, pk in zip(items, book_ids):
+            # A book deleted since resolve_books isn't among the locked rows
+            if pk is None or available.get(pk) is None:
+                outcomes.append((item, pk, 'not_found'))
+            elif available[pk] - taken[pk] > 0:
+                taken[pk] += 1
+                outcomes.append((item, pk, 'borrowed'))
+            else:
+                outcomes.append((item, pk, 'unavailable'))
+
+        new_loans = []
+        if taken:
+            Book.objects.filter(pk__in=taken).update(
+                available_copies=F('available_copies') - stats.per_row(taken),
+                lifetime_loans=F('lifetime_loans') + stats.per_row(taken),
+                updated_at=timezone.now(),
+            )
+            new_loans = Loan.objects.bulk_create(
+                [Loan(user=user, book_id=pk) for _, pk, outcome in outcomes if outcome == 'borrowed']
+            )
+            stats.loans_opened(new_loans)
+            invalidate_catalogue()
+            changes.record(
+                changes.book_entries(taken, copies={pk: available[pk] - n for pk, n in taken.items()})
+                + changes.loan_entries(new_loans)
+            )
+
+    loans_iter = iter(new_loans)
+    return [
+        item_result(item, pk, 'borrowed', loan=next(loans_iter)) if outcome == 'borrowed'
+        else item_result(item, pk, outcome, detail=UNAVAILABLE_MESSAGE if outcome == 'unavailable' else 'Book not found.')
+        for item, pk, outcome in outcomes
+    ]
+
+
+@serialized_write
+def bulk_return(user, items, any_user=False):
+    """
+    Returns every requested book in one transaction: each item closes the
+    oldest still-open loan of that book held by `user` (or by anyone, with
+    any_user=True, for a librarian emptying a returns cart).
+
+    Like return_book, loans are locked before books; both sets are locked
+    in a fixed order (loans by book then age, books by primary key).
+    """
+    book_ids = resolve_books(items)
+    with transaction.atomic():
+        open_loans = Loan.objects.select_for_update().filter(
+            book_id__in={pk for pk in book_ids if pk}, return_date__isnull=True
+        )
+        if not any_user:
+            open_loans = open_loans.filter(user=user)
+        queues = defaultdict(list)
+        for loan in open_loans.order_by('book_id', 'loan_date', 'id'):
+            queues[loan.book_id].append(loan)
+
+        today = timezone.localdate()
+        closed, outcomes = [], []
+        for item, pk in zip(items, book_ids):
+            if pk is None:
+                outcomes.append(item_result(item, pk, 'not_found', detail='Book not found.'))
+            elif queues[pk]:
+                loan = queues[pk].pop(0)
+                loan.return_date = today
+                closed.append(loan)
+                outcomes.append(item_result(item, pk, 'returned', loan=loan))
+            else:
+                outcomes.append(item_result(item, pk, 'no_active_loan', detail='No active loan for this book.'))
+
+        if closed:
+            Loan.objects.filter(pk__in=[loan.pk for loan in closed]).update(return_date=today, updated_at=timezone.now())
+            stats.loans_closed(closed)
+            shelved = promote_holds(Counter(loan.book_id for loan in closed))
+            if shelved:
+                Book.objects.filter(pk__in=shelved).update(
+                    available_copies=F('available_copies') + stats.per_row(shelved), updated_at=timezone.now()
+                )
+            invalidate_catalogue()
+            changes.record(changes.book_entries({loan.book_id for loan in closed}) + changes.loan_entries(closed))
+    return outcomes
+
+
+@serialized_write
+def place_hold(user, book_id):
+    """
+    Queues `user` for a book that has no copies on the shelf.
+    """
+    with transaction.atomic():
+        copies = Book.objects.select_for_update().filter(pk=book_id).values_list('available_copies', flat=True).first()
+        if copies is None:
+            raise NotFound('Book not found.')
+        if copies > 0:
+            raise ValidationError({'book': ['This book is available; borrow it instead.']})
+        try:
+            with transaction.atomic():
+                return Hold.objects.create(user=user, book_id=book_id)
+        except IntegrityError:
+            raise ValidationError({'book': ['You are already waiting for this book.']})
+
+
+@serialized_write
+def cancel_hold(user, book_id):
+    if not Hold.objects.filter(user=user, book_id=book_id, fulfilled_at__isnull=True).delete()[0]:
+        raise NotFound('You are not waiting for this book.')
+
+
+def hold_status(user, book_id):
+    """
+    Returns (hold, position, queue_length) for the user's latest hold on the
+    book; position is 1 for the head of the queue and None once fulfilled.
+    """
+    hold = Hold.objects.filter(user=user, book_id=book_id).order_by('-created', '-id').first()
+    if hold is None:
+        raise NotFound('You are not waiting for this book.')
+    if hold.fulfilled_at is not None:
+        return hold, None, None
+    ahead = Q(created__lt=hold.created) | Q(created=hold.created, id__lt=hold.id)
+    counts = Hold.objects.filter(book_id=book_id, fulfilled_at__isnull=True).aggregate(
+        ahead=Count('id', filter=ahead), waiting=Count('id')
+    )
+    return hold, counts['ahead'] + 1, counts['waiting']
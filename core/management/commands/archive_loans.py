@@ -0,0 +1,38 @@
+# core/management/commands/archive_loans.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.archive import archive_loans
+
+
+class Command(BaseCommand):
+    help = ('Moves loans returned more than LOAN_ARCHIVE_DAYS ago into the archive table, in batches, '
+            'and reports the throughput. With --every, keeps running on a local schedule.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Loans per transaction (default LOAN_ARCHIVE_BATCH)')
+        parser.add_argument('--every', type=float, default=0, help='Run again every N seconds until interrupted')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['batch_size'], options['verbosity'])
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run_once(self, batch_size, verbosity):
+        def progress(totals):
+            if verbosity > 1:
+                self.stdout.write(f"  {totals['moved']} moved, {totals['seconds']:.1f}s")
+
+        totals = archive_loans(batch_size=batch_size, progress=progress)
+        rate = totals['moved'] / totals['seconds'] if totals['seconds'] else 0
+        self.stdout.write(
+            f"{totals['moved']} loan(s) archived in {totals['batches']} batch(es), "
+            f"{totals['seconds']:.2f}s ({rate:,.0f} loans/s)"
+        )
@@ -0,0 +1,97 @@
+# core/management/commands/bench.py
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bench.data import seed, set_bench_passwords
+from core.bench.report import build_report, compare, load_report
+from core.bench.runner import HTTPTransport, InProcessTransport, quiet_request_log, run_load
+from core.bench.scenarios import SCENARIOS, BenchContext
+from core.models import Book, Loan
+
+User = get_user_model()
+
+
+def percent(change):
+    return 'n/a' if change is None else f'{change:+.1f}%'
+
+
+def int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds Book/CustomUser/Loan data and load-tests the API (books, loans, token, borrow/return) '
+        'at each concurrency level, in-process or against a running server (--url). Writes a JSON '
+        'report with throughput, p50/p95/p99 latency and SQL queries per request; pass --baseline '
+        'with an earlier report to compare commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Any of: {', '.join(SCENARIOS)}")
+        parser.add_argument('--concurrency', type=int_list, default=[1, 8, 32], help='Comma-separated levels')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario and level')
+        parser.add_argument('--token-requests', type=int, default=50, help='Requests per level for token')
+        parser.add_argument('--url', help='Base URL of a running server; default runs in-process')
+        parser.add_argument('--books', type=int, default=50_000)
+        parser.add_argument('--loans', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--skip-seed', action='store_true')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+
+    def handle(self, *args, **options):
+        names = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        if not options['skip_seed']:
+            self.stderr.write('Seeding...')
+            seed(options['books'], options['loans'], options['users'], stdout=self.stderr)
+            # Raw-inserted loans bypass the counters the API maintains
+            call_command('reconcile_stats', fix=True, stdout=self.stderr)
+        set_bench_passwords()
+
+        try:
+            context = BenchContext(max(options['concurrency']))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['url']:
+            transport, make_transport = options['url'], lambda: HTTPTransport(options['url'])
+        else:
+            transport, make_transport = 'in-process', InProcessTransport
+
+        results = []
+        with quiet_request_log():
+            for name in names:
+                scenario = SCENARIOS[name](context)
+                requests = options['token_requests'] if name == 'token' else options['requests']
+                for concurrency in options['concurrency']:
+                    run = run_load(scenario, make_transport, concurrency, requests)
+                    results.append(run)
+                    latency = run['latency_ms'] or {}
+                    self.stderr.write(
+                        f"{name:14} c={concurrency:<4} {run['throughput_rps'] or 0:9.1f} req/s  "
+                        f"p50 {latency.get('p50', 0):8.2f}ms  p95 {latency.get('p95', 0):8.2f}ms  "
+                        f"p99 {latency.get('p99', 0):8.2f}ms  errors {run['errors']}"
+                    )
+
+        rows = {'books': Book.objects.count(), 'users': User.objects.count(), 'loans': Loan.objects.count()}
+        report = build_report(results, transport, rows)
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(body + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(body)
+
+        if options['baseline']:
+            self.stderr.write(f"\n{'scenario':14} {'conc':>5} {'req/s change':>13} {'p95 change':>11}")
+            for name, concurrency, throughput, p95 in compare(report, load_report(options['baseline'])):
+                self.stderr.write(f'{name:14} {concurrency:5} {percent(throughput):>13} {percent(p95):>11}')
@@ -0,0 +1,104 @@
+# core/management/commands/bench_asgi.py
+
+import http.client
+import os
+import subprocess
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bench.data import seed
+from core.bench.runner import HTTPTransport, run_load
+from core.bench.scenarios import FixedRequest
+from core.models import Book
+from core.serializers import LibraryTokenObtainPairSerializer
+
+User = get_user_model()
+
+# Same reads on both servers: the DRF endpoints under WSGI and their async
+# mirrors under ASGI
+ENDPOINTS = {
+    'wsgi': {'books': '/api/books/?page_size=50', 'book': '/api/books/{book}/', 'my loans': '/api/loans/my/'},
+    'asgi': {'books': '/api/async/books/?page_size=50', 'book': '/api/async/books/{book}/',
+             'my loans': '/api/async/loans/my/'},
+}
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'library_management.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads)]
+    return [sys.executable, '-m', 'gunicorn', 'library_management.asgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '-k', 'uvicorn.workers.UvicornWorker']
+
+
+def wait_until_up(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'Server exited with code {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/books/?page_size=1')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('Server did not start in time')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the read endpoints under gunicorn (WSGI, threaded workers) and '
+        'gunicorn + uvicorn workers (ASGI, async views) on the current database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=8, help='WSGI threads per worker')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--books', type=int, default=10_000)
+        parser.add_argument('--loans', type=int, default=50_000)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.stdout.write('Seeding...')
+            seed(options['books'], options['loans'], options['users'], stdout=self.stdout)
+
+        user = User.objects.filter(loans__isnull=False).first()
+        book = Book.objects.order_by('id').values_list('id', flat=True).first()
+        if user is None or book is None:
+            raise CommandError('No loans to read; run without --skip-seed first.')
+        token = str(LibraryTokenObtainPairSerializer.get_token(user).access_token)
+        headers = {'Authorization': f'Bearer {token}', 'Host': 'localhost'}
+
+        self.stdout.write(f"\n{'server':6} {'endpoint':10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'errors':>7}")
+        env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+        # The async views skip the catalogue cache, so compare database reads
+        env.setdefault('CATALOGUE_CACHE_URL', 'dummy://')
+        for mode in options['modes'].split(','):
+            command = server_command(mode, options['port'], options['workers'], options['threads'])
+            process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(options['port'], process)
+                base_url = f"http://127.0.0.1:{options['port']}"
+                for label, path in ENDPOINTS[mode].items():
+                    scenario = FixedRequest(label, path.format(book=book), headers)
+                    run_load(scenario, lambda: HTTPTransport(base_url), options['concurrency'], options['concurrency'])
+                    run = run_load(
+                        scenario, lambda: HTTPTransport(base_url), options['concurrency'], options['requests']
+                    )
+                    latency = run['latency_ms']
+                    self.stdout.write(f"{mode:6} {label:10} {run['throughput_rps']:9.0f} {latency['p50']:8.1f} "
+                                      f"{latency['p95']:8.1f} {latency['p99']:8.1f} {run['errors']:7}")
+            finally:
+                process.terminate()
+                process.wait()
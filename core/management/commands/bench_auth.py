@@ -0,0 +1,50 @@
+# core/management/commands/bench_auth.py
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.authentication import ClaimsJWTAuthentication
+from core.serializers import LibraryTokenObtainPairSerializer
+from core.views import LoanViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compares authenticated request throughput with per-request user lookup vs trusted JWT claims.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email='bench-auth@example.com', defaults={'username': 'bench-auth'})
+        token = str(LibraryTokenObtainPairSerializer.get_token(user).access_token)
+        factory = APIRequestFactory()
+        # Claims are only trusted with a token version cache; without a
+        # configured one, time them against a local-memory cache
+        token_cache = {} if settings.TOKEN_VERSION_CACHE_ALIAS else {
+            'CACHES': {**settings.CACHES, 'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            'TOKEN_VERSION_CACHE_ALIAS': 'tokens',
+        }
+
+        self.stdout.write(f"{'authentication':28} {'req/s':>9} {'queries/req':>12}")
+        for label, auth_class in (('JWTAuthentication', JWTAuthentication),
+                                  ('ClaimsJWTAuthentication', ClaimsJWTAuthentication)):
+            view = LoanViewSet.as_view({'get': 'my_loans'}, authentication_classes=[auth_class])
+            with override_settings(**token_cache), CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request = factory.get('/api/loans/my/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST='localhost')
+                    response = view(request)
+                    assert response.status_code == 200, response.data
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label:28} {options['requests'] / elapsed:9.0f} {len(ctx.captured_queries) / options['requests']:12.2f}"
+            )
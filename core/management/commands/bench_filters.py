@@ -0,0 +1,173 @@
+# core/management/commands/bench_filters.py
+
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.bench.data import GENRES, SEED_ISBN_PREFIX, seed
+from core.models import Book, Loan
+from core.search import FTS_TABLE, get_search_backend, index_book_queryset
+
+User = get_user_model()
+
+
+def filter_queries(user_ids, book_ids):
+    """
+    One query factory per filterset_fields/ordering_fields combination the
+    Book and Loan viewsets expose. Each returns a first page, like the API.
+    """
+    rng = random.Random(7)
+    today = date.today()
+    return {
+        'books?ordering=title': lambda: Book.objects.order_by('title')[:10],
+        'books?author=X&ordering=title': lambda: Book.objects.filter(
+            author=f'Author {rng.randrange(len(book_ids) // 20 + 1)}').order_by('title')[:10],
+        'books?genre=X&ordering=title': lambda: Book.objects.filter(genre=rng.choice(GENRES)).order_by('title')[:10],
+        'books?published_date=X': lambda: Book.objects.filter(
+            published_date=today - timedelta(days=rng.randrange(36500)))[:10],
+        'books?available_copies=0': lambda: Book.objects.filter(available_copies=0)[:10],
+        'loans (per user, by date)': lambda: Loan.objects.filter(
+            user_id=rng.choice(user_ids)).order_by('-loan_date')[:10],
+        'loans?book=X&ordering=loan_date': lambda: Loan.objects.filter(
+            book_id=rng.choice(book_ids)).order_by('loan_date')[:10],
+        'loans?loan_date=X': lambda: Loan.objects.filter(
+            loan_date=today - timedelta(days=rng.randrange(3650)))[:10],
+        'loans?return_date=X': lambda: Loan.objects.filter(
+            return_date=today - timedelta(days=rng.randrange(3650)))[:10],
+        'loans active per user': lambda: Loan.objects.filter(
+            user_id=rng.choice(user_ids), return_date__isnull=True)[:10],
+        **search_queries(),
+    }
+
+
+def search_queries():
+    """
+    ?search= first pages: a term every seeded book matches (the worst case
+    for ranking), one genre's worth and a narrow author.
+    """
+    backend = get_search_backend(connection.alias)
+    if backend is None:
+        return {}
+    return {
+        f'books?search={term}': lambda tokens=term.split(): backend.search(Book.objects.all(), tokens)[:10]
+        for term in ('title', 'fiction', 'author 7')
+    }
+
+
+def search_plan():
+    """
+    EXPLAIN QUERY PLAN lines for a ranked SQLite full-text search, and
+    whether it runs the FTS query once (a join) rather than per result.
+    """
+    backend = get_search_backend(connection.alias)
+    if connection.vendor != 'sqlite' or backend is None:
+        return None, None
+    sql, params = backend.search(Book.objects.all(), ['title'])[:10].query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        lines = [row[-1] for row in cursor.fetchall()]
+    scans = [line for line in lines if FTS_TABLE in line and 'VIRTUAL TABLE' in line]
+    correlated = any('CORRELATED' in line for line in lines)
+    return lines, len(scans) == 1 and not correlated
+
+
+def measure(queries, repeat):
+    """
+    Returns {name: (p50_ms, p99_ms)} over `repeat` runs of each query.
+    """
+    report = {}
+    for name, make_query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(make_query())
+            timings.append((time.perf_counter() - started) * 1000)
+        cuts = statistics.quantiles(timings, n=100)
+        report[name] = (statistics.median(timings), cuts[98])
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds large Book/Loan tables and reports p50/p99 latency per filter with and without indexes. '
+        'Runs on a scratch test database unless --i-know-this-drops-indexes is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1_000_000)
+        parser.add_argument('--loans', type=int, default=5_000_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--skip-seed', action='store_true', help='Benchmark existing data only.')
+        parser.add_argument(
+            '--keepdb', action='store_true', help='Keep the scratch database (and its seeded rows) for the next run.'
+        )
+        parser.add_argument(
+            '--i-know-this-drops-indexes', action='store_true', dest='in_place',
+            help='Seed and benchmark the configured database itself, dropping and re-adding its Book/Loan indexes.',
+        )
+
+    def handle(self, *args, **options):
+        if options['in_place']:
+            return self.benchmark(options)
+        # Seeding and dropping indexes never touch the configured database:
+        # both happen on a throwaway test database next to it
+        name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(name, verbosity=0, keepdb=options['keepdb'])
+
+    def benchmark(self, options):
+        if options['skip_seed']:
+            user_ids = list(User.objects.values_list('id', flat=True))
+            book_ids = list(Book.objects.values_list('id', flat=True))
+        else:
+            self.stdout.write('Seeding...')
+            user_ids, book_ids = seed(options['books'], options['loans'], options['users'], stdout=self.stdout)
+            # Raw inserts skip the search index, which the ?search= rows need
+            index_book_queryset(Book.objects.filter(isbn__startswith=SEED_ISBN_PREFIX))
+            if options['in_place']:
+                # ... and the counters; leave the kept rows consistent with
+                # what the API maintains
+                call_command('reconcile_stats', fix=True, stdout=self.stdout)
+        if not user_ids or not book_ids:
+            self.stderr.write(self.style.ERROR('Nothing to benchmark: no users or books.'))
+            return
+
+        queries = filter_queries(user_ids, book_ids)
+        indexes = [(model, index) for model in (Book, Loan) for index in model._meta.indexes]
+
+        # "Before": drop the indexes from core's Meta, measure, then put them back
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        try:
+            before = measure(queries, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+        after = measure(queries, options['repeat'])
+
+        self.stdout.write(f"\n{'filter':40} {'p50 before':>11} {'p99 before':>11} {'p50 after':>11} {'p99 after':>11}")
+        for name in queries:
+            self.stdout.write(
+                f'{name:40} {before[name][0]:10.2f}ms {before[name][1]:10.2f}ms '
+                f'{after[name][0]:10.2f}ms {after[name][1]:10.2f}ms'
+            )
+
+        lines, single_match = search_plan()
+        if lines is not None:
+            self.stdout.write('\nSearch query plan:\n' + '\n'.join(f'  {line}' for line in lines))
+            if single_match:
+                self.stdout.write(self.style.SUCCESS('Full-text search runs its MATCH once per query.'))
+            else:
+                self.stdout.write(self.style.WARNING('Full-text search runs its MATCH more than once per query.'))
@@ -0,0 +1,86 @@
+# core/management/commands/bench_hashers.py
+
+import itertools
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.bench.runner import InProcessTransport, quiet_request_log, run_load
+from core.bench.scenarios import Scenario
+
+User = get_user_model()
+
+PASSWORD = 'BenchHashPassword123!'
+STRATEGIES = {
+    'pbkdf2': 'core.hashers.PooledPBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.TunedScryptPasswordHasher',
+    'argon2': 'core.hashers.TunedArgon2PasswordHasher',
+}
+
+
+class Logins(Scenario):
+    """
+    POST /api/token/ for the given accounts in turn, each worker starting
+    at a different one.
+    """
+    name = 'logins'
+
+    def __init__(self, emails):
+        self.emails = emails
+
+    def steps(self, worker):
+        for n in itertools.count(worker):
+            yield 'POST', '/api/token/', {'email': self.emails[n % len(self.emails)], 'password': PASSWORD}, None
+
+
+def logins_per_second(emails, concurrency, logins):
+    """
+    Runs `logins` logins from `concurrency` threads through the full stack
+    in-process and returns (logins/s, failures).
+    """
+    run = run_load(Logins(emails), InProcessTransport, concurrency, logins)
+    return run['throughput_rps'] or 0, run['errors']
+
+
+class Command(BaseCommand):
+    help = 'Measures hash time and logins/sec (and per core) for each password hashing strategy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategies', default=','.join(STRATEGIES))
+        parser.add_argument('--logins', type=int, default=40)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing pool size (0 = inline)')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        emails = [f'bench-hash{i}@example.com' for i in range(options['users'])]
+        for email in emails:
+            User.objects.get_or_create(email=email, defaults={'username': email.split('@')[0]})
+
+        self.stdout.write(f'{cores} CPU core(s), hashing pool: {options["workers"] or "inline"}')
+        self.stdout.write(f"{'strategy':8} {'hash ms':>8} {'logins/s c=1':>13} "
+                          f"{'logins/s c=' + str(options['concurrency']):>14} {'per core':>9} {'failed':>7}")
+        for name in options['strategies'].split(','):
+            hashers = [STRATEGIES[name]] + [path for key, path in STRATEGIES.items() if key != name]
+            with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASH_WORKERS=options['workers']):
+                try:
+                    get_hasher().encode(PASSWORD, 'benchsalt0123456')
+                except ValueError as exc:  # e.g. argon2-cffi not installed
+                    self.stdout.write(f'{name:8} skipped: {exc}')
+                    continue
+
+                started = time.perf_counter()
+                encoded = make_password(PASSWORD)
+                hash_ms = (time.perf_counter() - started) * 1000
+                User.objects.filter(email__in=emails).update(password=encoded)
+
+                with quiet_request_log():  # Shed logins (503s) are counted as failures
+                    single, failed_single = logins_per_second(emails, 1, max(1, options['logins'] // 4))
+                    parallel, failed = logins_per_second(emails, options['concurrency'], options['logins'])
+                self.stdout.write(f'{name:8} {hash_ms:8.1f} {single:13.1f} {parallel:14.1f} '
+                                  f'{parallel / cores:9.1f} {failed_single + failed:7}')
@@ -0,0 +1,64 @@
+# core/management/commands/bench_paging.py
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.bench.data import seed
+from core.models import Loan
+from core.pagination import encode_cursor
+from core.views import LoanViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compares page-number (OFFSET) and keyset (?cursor=) paging latency on /api/loans/ at increasing depth.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=2_000_000)
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.stdout.write('Seeding...')
+            seed(options['books'], options['loans'], options['users'], stdout=self.stdout)
+
+        total = Loan.objects.count()
+        page_size = options['page_size']
+        staff = User.objects.filter(is_staff=True).first() or User(id=0, is_staff=True, is_active=True)
+        view = LoanViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        def timed(params):
+            timings = []
+            for _ in range(options['repeat']):
+                request = factory.get(
+                    '/api/loans/', {'ordering': '-loan_date', 'page_size': page_size, **params}, HTTP_HOST='localhost'
+                )
+                force_authenticate(request, user=staff)
+                started = time.perf_counter()
+                response = view(request)
+                response.render()
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.data
+            return statistics.median(timings)
+
+        self.stdout.write(f'\n{total} loans, page size {page_size}, ordering=-loan_date')
+        self.stdout.write(f"{'depth (rows)':>14} {'page-number p50':>16} {'keyset p50':>12}")
+        depth = page_size
+        while depth < total:
+            # The keyset cursor for this depth is the key of the row just before it
+            loan_date, pk = Loan.objects.order_by('-loan_date', '-id').values_list('loan_date', 'id')[depth - 1]
+            cursor = encode_cursor([loan_date, pk])
+            offset_ms = timed({'page': depth // page_size + 1})
+            keyset_ms = timed({'cursor': cursor})
+            self.stdout.write(f'{depth:>14} {offset_ms:>14.2f}ms {keyset_ms:>10.2f}ms')
+            depth *= 10
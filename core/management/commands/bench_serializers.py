@@ -0,0 +1,60 @@
+# core/management/commands/bench_serializers.py
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core.bench.data import seed
+from core.bench.runner import ViewTransport, run_load
+from core.bench.scenarios import FixedRequest
+from core.renderers import ORJSONRenderer, orjson
+from core.views import BookViewSet, LoanViewSet
+
+User = get_user_model()
+
+RENDERERS = {'json': JSONRenderer, 'orjson': ORJSONRenderer}
+
+
+class Command(BaseCommand):
+    help = 'Compares the regular and .values() list serializers, and the JSON and orjson renderers, by page size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=10_000)
+        parser.add_argument('--books', type=int, default=2_000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--sizes', default='10,100,1000')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.stdout.write('Seeding...')
+            seed(options['books'], options['loans'], options['users'], stdout=self.stdout)
+
+        staff = User.objects.filter(is_staff=True).first() or User(id=0, is_staff=True, is_active=True)
+        renderers = [name for name in RENDERERS if name == 'json' or orjson is not None]
+        # Time the serializers, not the catalogue cache
+        no_cache = {**settings.CACHES, settings.CATALOGUE_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }}
+
+        def timed(viewset, path, page_size, fast, renderer):
+            view = viewset.as_view({'get': 'list'}, renderer_classes=[RENDERERS[renderer]])
+            scenario = FixedRequest(path, f'{path}?page_size={page_size}')
+            with override_settings(FAST_LIST_SERIALIZERS=fast, CACHES=no_cache):
+                run = run_load(scenario, lambda: ViewTransport(view, staff), 1, options['repeat'])
+            if run['errors']:
+                raise CommandError(f'{path}?page_size={page_size}: {run["errors"]} failed request(s)')
+            return run['latency_ms']['p50']
+
+        for viewset, path in [(BookViewSet, '/api/books/'), (LoanViewSet, '/api/loans/')]:
+            self.stdout.write(f'\n{path} p50 per page')
+            columns = [(fast, renderer) for fast in (False, True) for renderer in renderers]
+            self.stdout.write(f"{'page size':>10}" + ''.join(
+                f" {('values' if fast else 'model') + '+' + renderer:>15}" for fast, renderer in columns
+            ))
+            for size in map(int, options['sizes'].split(',')):
+                cells = [timed(viewset, path, size, fast, renderer) for fast, renderer in columns]
+                self.stdout.write(f'{size:>10}' + ''.join(f' {ms:>13.2f}ms' for ms in cells))
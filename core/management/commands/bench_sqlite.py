@@ -0,0 +1,126 @@
+# core/management/commands/bench_sqlite.py
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from core.bench.runner import InProcessTransport, quiet_request_log, run_load
+from core.bench.scenarios import Scenario
+from core.models import Book, Loan
+from core.serializers import LibraryTokenObtainPairSerializer
+
+User = get_user_model()
+
+
+def production_options():
+    return {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in settings.SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    }
+
+
+# (connection OPTIONS, write queue on); 'default' is Django's stock SQLite setup
+MODES = {
+    'default': (lambda: {'init_command': 'PRAGMA journal_mode=DELETE'}, False),
+    'production': (production_options, False),
+    'production+queue': (production_options, True),
+}
+
+
+class SharedBookBorrowReturn(Scenario):
+    """
+    Every worker borrows and returns the same book as its own user, so all
+    the writes contend for one row (and, on SQLite, the one write lock).
+    """
+    name = 'borrow_return'
+
+    def __init__(self, book_id, tokens):
+        self.book_id, self.tokens = book_id, tokens
+
+    def steps(self, worker):
+        headers = {'Authorization': f'Bearer {self.tokens[worker]}'}
+        while True:
+            yield 'POST', f'/api/books/{self.book_id}/borrow/', None, headers
+            yield 'POST', f'/api/books/{self.book_id}/return/', None, headers
+
+
+class Command(BaseCommand):
+    help = 'Compares concurrent borrow+return throughput on SQLite: stock settings, production pragmas, write queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES))
+        parser.add_argument('--loans', type=int, default=400, help='Borrow+return cycles per round')
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_sqlite needs a SQLite database.')
+        # Every mode runs on a throwaway copy: the journal mode a mode sets
+        # is stored in the database file, and "default" turns WAL off
+        name, original = connection.settings_dict['NAME'], connection.settings_dict.get('OPTIONS', {})
+        with tempfile.TemporaryDirectory() as scratch:
+            copy = os.path.join(scratch, 'bench.sqlite3')
+            connection.ensure_connection()
+            target = sqlite3.connect(copy)
+            try:
+                connection.connection.backup(target)
+            finally:
+                target.close()
+            connections.close_all()
+            connection.settings_dict['NAME'] = copy
+            try:
+                self.compare(options)
+            finally:
+                connections.close_all()
+                connection.settings_dict['NAME'] = name
+                connection.settings_dict['OPTIONS'] = original
+
+    def compare(self, options):
+        self.stdout.write(f"{'mode':18} {'loans/s':>10} {'p95 ms':>9} {'errors':>7} {'oversold':>9}")
+        for mode in options['modes'].split(','):
+            make_options, queued = MODES[mode]
+            # New connections (one per worker thread) pick up these OPTIONS;
+            # connect once here first so the journal mode switch runs alone
+            connections.close_all()
+            connection.settings_dict['OPTIONS'] = make_options()
+            connection.ensure_connection()
+            with override_settings(SQLITE_WRITE_QUEUE=queued), quiet_request_log():
+                rates, p95s, errors, oversold = [], [], 0, 0
+                for _ in range(options['rounds']):
+                    run, oversell = self.round(options['loans'], options['workers'])
+                    rates.append((run['throughput_rps'] or 0) / 2)
+                    p95s.append(run['latency_ms']['p95'] if run['latency_ms'] else 0)
+                    # Each a "database is locked" (or other) error response
+                    errors += run['errors']
+                    oversold += oversell
+            rate, p95 = sorted(rates)[len(rates) // 2], sorted(p95s)[len(p95s) // 2]
+            self.stdout.write(f'{mode:18} {rate:>10.1f} {p95:>9.1f} {errors:>7} {oversold:>9}')
+
+    def round(self, loans, workers):
+        # One copy per worker, so every borrow and return should succeed
+        book = Book.objects.create(
+            title='SQLite Bench Book', author='Load Generator',
+            isbn=f'Q{int(time.time() * 1000) % 10**12:012d}', available_copies=workers,
+        )
+        users = User.objects.bulk_create([
+            User(email=f'sqlite-bench-{book.pk}-{i}@example.com', username=f'sqlite-bench-{book.pk}-{i}')
+            for i in range(workers)
+        ])
+        tokens = [str(LibraryTokenObtainPairSerializer.get_token(user).access_token) for user in users]
+        try:
+            run = run_load(SharedBookBorrowReturn(book.pk, tokens), InProcessTransport, workers, 2 * loans)
+            book.refresh_from_db()
+            still_out = Loan.objects.filter(book=book, return_date__isnull=True).count()
+            return run, int(still_out + book.available_copies != workers)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            book.delete()
@@ -0,0 +1,43 @@
+# core/management/commands/build_recommendations.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Precomputes "borrowers also borrowed" neighbours for /api/books/<id>/related/. Refreshes only '
+            'the books affected by loans since the last run, unless --full. With --every, keeps running '
+            'on a local schedule.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every book from all loans')
+        parser.add_argument('--chunk-users', type=int, default=None,
+                            help='Users whose loans are read per chunk (default RECOMMENDATIONS_CHUNK_USERS)')
+        parser.add_argument('--every', type=float, default=0, help='Run again every N seconds until interrupted')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['full'], options['chunk_users'], options['verbosity'])
+            if not options['every']:
+                break
+            options['full'] = False  # Later passes are incremental
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run_once(self, full, chunk_users, verbosity):
+        def progress(totals):
+            if verbosity > 1:
+                self.stdout.write(f"  {totals['chunks']} chunk(s), {totals['pairs']} pairs, {totals['seconds']:.1f}s")
+
+        totals = recommendations.build_recommendations(full=full, chunk_users=chunk_users, progress=progress)
+        engine = 'numpy/scipy' if recommendations.sparse is not None else 'pure Python'
+        rate = totals['pairs'] / totals['seconds'] if totals['seconds'] else 0
+        self.stdout.write(
+            f"{'Full' if totals['full'] else 'Incremental'} build ({engine}): {totals['books']} book(s) refreshed "
+            f"from {totals['pairs']} borrower/book pairs in {totals['chunks']} chunk(s), "
+            f"{totals['seconds']:.2f}s ({rate:,.0f} pairs/s)"
+        )
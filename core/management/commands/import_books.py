@@ -0,0 +1,38 @@
+# core/management/commands/import_books.py
+
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import import_books
+from core.parsers import iter_csv, iter_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports (upserts on ISBN) books from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'jsonl')
+        reader = iter_csv if fmt == 'csv' else iter_jsonl
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as handle:
+                report = import_books(reader(handle), batch_size=options['batch_size'])
+        except (OSError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, failed {report['failed']} "
+            f"in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,39 @@
+# core/management/commands/process_overdue.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.overdue import process_overdue
+
+
+class Command(BaseCommand):
+    help = ('Marks open loans past their due date as overdue and sets their fines, in resumable batches. '
+            'With --every, keeps running on a local schedule.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Loans per transaction (default OVERDUE_BATCH)')
+        parser.add_argument('--restart', action='store_true', help="Walk from the start even if today's pass finished")
+        parser.add_argument('--every', type=float, default=0, help='Run again every N seconds until interrupted')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['batch_size'], options['restart'], options['verbosity'])
+            if not options['every']:
+                break
+            options['restart'] = False  # Later passes resume or skip as usual
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run_once(self, batch_size, restart, verbosity):
+        def progress(totals):
+            if verbosity > 1:
+                self.stdout.write(f"  {totals['walked']} walked, {totals['updated']} updated, {totals['seconds']:.1f}s")
+
+        totals = process_overdue(batch_size=batch_size, restart=restart, progress=progress)
+        rate = totals['walked'] / totals['seconds'] if totals['seconds'] else 0
+        self.stdout.write(
+            f"{totals['walked']} overdue loan(s) walked in {totals['batches']} batch(es), "
+            f"{totals['updated']} updated, {totals['seconds']:.2f}s ({rate:,.0f} loans/s)"
+        )
@@ -0,0 +1,36 @@
+# core/management/commands/prune_changes.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Change
+
+
+class Command(BaseCommand):
+    help = ('Deletes change feed entries older than --days. Clients holding an older cursor '
+            'get 410 Gone and reload; the newest entry is always kept so that can be detected.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGE_FEED_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        newest = Change.objects.aggregate(seq=Max('pk'))['seq']
+        if newest is None:
+            return
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = 0
+        while True:
+            # Primary-key batches keep each DELETE (and its locks) short
+            batch = list(
+                Change.objects.filter(created__lt=cutoff, pk__lt=newest)
+                .order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            deleted += Change.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f'Deleted {deleted} change(s) older than {options["days"]} day(s).')
@@ -0,0 +1,117 @@
+# core/management/commands/stress_borrow.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from rest_framework.exceptions import ValidationError
+
+from core import loans
+from core.models import Book, Loan
+
+User = get_user_model()
+
+
+def run_concurrent_borrows(book_id, users, workers=32, retries=50, and_return=False):
+    """
+    Fires one borrow per user at the same book from a thread pool and
+    returns counts plus throughput. Workers block on a start gate until every
+    attempt is queued so the borrows genuinely overlap. With and_return,
+    each successful borrower returns the book straight away.
+
+    SQLite reports lock contention as an OperationalError instead of
+    blocking, so those attempts are retried with a short backoff and
+    counted as lock_retries (each one a "database is locked" 500 had it
+    been a request).
+    """
+    start = threading.Event()
+    results = {'borrowed': 0, 'unavailable': 0, 'errors': 0, 'lock_retries': 0}
+    lock = threading.Lock()
+
+    def retried(write, *args):
+        # Returns (outcome, lock retries) for one write, retrying lock errors
+        for n in range(retries):
+            try:
+                write(*args)
+                return 'ok', n
+            except ValidationError:
+                return 'unavailable', n
+            except OperationalError:
+                time.sleep(0.001 * (n + 1))
+        return 'errors', retries
+
+    def attempt(user):
+        try:
+            start.wait()
+            outcome, failed = retried(loans.borrow_book, user, book_id)
+            if outcome == 'ok':
+                outcome = 'borrowed'
+                if and_return:
+                    returned, more = retried(loans.return_book, user, book_id)
+                    failed += more
+                    if returned == 'errors':
+                        outcome = 'errors'
+            with lock:
+                results[outcome] += 1
+                results['lock_retries'] += failed
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(attempt, user) for user in users]
+        started = time.perf_counter()
+        start.set()
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    results['attempts'] = len(users)
+    results['seconds'] = round(elapsed, 4)
+    results['borrows_per_second'] = round(len(users) / elapsed, 1) if elapsed else None
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Fires many simultaneous borrows at one book and checks that no copies are oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--borrowers', type=int, default=500)
+        parser.add_argument('--copies', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=64)
+
+    def handle(self, *args, **options):
+        book = Book.objects.create(
+            title='Stress Test Book', author='Load Generator',
+            isbn=f'S{int(time.time() * 1000) % 10**12:012d}',
+            available_copies=options['copies'],
+        )
+        users = User.objects.bulk_create([
+            User(email=f'stress-{book.pk}-{i}@example.com', username=f'stress-{book.pk}-{i}')
+            for i in range(options['borrowers'])
+        ])
+        try:
+            results = run_concurrent_borrows(book.pk, users, workers=options['workers'])
+            book.refresh_from_db()
+            loans_made = Loan.objects.filter(book=book).count()
+
+            self.stdout.write(f"Attempts:          {results['attempts']}")
+            self.stdout.write(f"Borrowed:          {results['borrowed']}")
+            self.stdout.write(f"Unavailable:       {results['unavailable']}")
+            self.stdout.write(f"Errors:            {results['errors']}")
+            self.stdout.write(f"Lock retries:      {results['lock_retries']}")
+            self.stdout.write(f"Elapsed (s):       {results['seconds']}")
+            self.stdout.write(f"Borrows/second:    {results['borrows_per_second']}")
+
+            if loans_made > options['copies'] or loans_made + book.available_copies != options['copies']:
+                self.stderr.write(self.style.ERROR(
+                    f'Oversold: {loans_made} loans for {options["copies"]} copies '
+                    f'({book.available_copies} left on the shelf)'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('No overselling detected.'))
+        finally:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            book.delete()
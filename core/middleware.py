@@ -0,0 +1,125 @@
+# core/middleware.py
+
+import cProfile
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .hashers import HashingBusy
+from .profiling import RequestProfile, metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise declared sync-only forces Django, under ASGI, to run the rest
+    of the stack (async views included) in a worker thread. This variant
+    supports both modes; static lookups are an in-memory dict hit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class HashingBusyMiddleware(MiddlewareMixin):
+    """
+    DRF answers HashingBusy (core.hashers) with a 503 itself; this does the
+    same for plain Django views that check passwords, like the admin login.
+    """
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(
+            str(exception.detail), status=exception.status_code, content_type='text/plain; charset=utf-8'
+        )
+        response['Retry-After'] = str(exception.wait)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (settings.PROFILING) per-request instrumentation: wall time, SQL
+    count/time with duplicate detection, and the phases timed in
+    core.profiling (auth, filter, serialize). Results go out as a
+    Server-Timing header and into the /metrics registry; a sampled
+    percentage of requests is also run under cProfile and dumped to
+    PROFILING_DUMP_DIR. Sync-only, so under ASGI it runs on a thread.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0) / 100
+        self.dump_dir = getattr(settings, 'PROFILING_DUMP_DIR', None)
+
+    def __call__(self, request):
+        if request.path_info == '/metrics':
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        profiler = cProfile.Profile() if self.dump_dir and random.random() < self.sample_rate else None
+        started = time.perf_counter()
+        with profiling(profile), ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                    stack.callback(profiler.disable)
+                except ValueError:  # another profiler is already active
+                    profiler = None
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(view, request.method, response.status_code, duration, profile)
+        response['Server-Timing'] = server_timing(duration, profile)
+        if profile.duplicate_queries:
+            logger.warning('%s %s ran %d duplicate SQL queries', request.method, request.path, profile.duplicate_queries)
+        if profiler is not None:
+            self.dump(profiler, view, request.method, duration)
+        return response
+
+    def dump(self, profiler, view, method, duration):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{method}-{duration * 1000:.0f}ms-{uuid.uuid4().hex[:6]}.prof"
+        profiler.dump_stats(os.path.join(self.dump_dir, name.replace(':', '_').replace('/', '_')))
+
+
+def server_timing(duration, profile):
+    entries = [
+        f'total;dur={duration * 1000:.2f}',
+        f'sql;dur={profile.sql_time * 1000:.2f};desc="{len(profile.queries)} queries, '
+        f'{profile.duplicate_queries} duplicate, {profile.similar_queries} similar"',
+    ]
+    entries += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in sorted(profile.phases.items())]
+    return ', '.join(entries)
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = """
+ALTER TABLE core_book ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(genre, '')), 'C')
+) STORED;
+CREATE INDEX book_search_vector_idx ON core_book USING gin (search_vector);
+"""
+POSTGRES_REVERSE = """
+DROP INDEX IF EXISTS book_search_vector_idx;
+ALTER TABLE core_book DROP COLUMN IF EXISTS search_vector;
+"""
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_book_fts USING fts5(title, author, isbn, genre)",
+    "INSERT INTO core_book_fts (rowid, title, author, isbn, genre) "
+    "SELECT id, title, author, isbn, coalesce(genre, '') FROM core_book",
+]
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS core_book_fts"]
+
+
+def forward(apps, schema_editor):
+    # Postgres keeps its tsvector column current by itself; the SQLite FTS5
+    # table is kept in sync by the Book signals in core/signals.py
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+def reverse(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_REVERSE)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_REVERSE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_loan_and_book_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, reverse),
+    ]
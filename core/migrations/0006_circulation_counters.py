@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_customuser_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('genre', models.CharField(blank=True, default='', max_length=100)),
+                ('loans', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='lifetime_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-lifetime_loans', 'id'], name='book_lifetime_loans_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='genrecirculation',
+            constraint=models.UniqueConstraint(fields=('day', 'genre'), name='unique_genre_circulation_day'),
+        ),
+    ]
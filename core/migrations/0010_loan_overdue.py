@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:39
+
+from datetime import timedelta
+
+import core.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_due_dates(apps, schema_editor):
+    # Existing loans fall due a loan period after they started: one UPDATE
+    # per distinct loan_date, on the loan_date index
+    Loan = apps.get_model('core', 'Loan')
+    period = timedelta(days=settings.LOAN_PERIOD_DAYS)
+    for day in Loan.objects.order_by().values_list('loan_date', flat=True).distinct():
+        Loan.objects.filter(loan_date=day).update(due_date=day + period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sync_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('position', models.JSONField(blank=True, null=True)),
+                ('done', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='due_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(backfill_due_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='loan',
+            name='due_date',
+            field=models.DateField(default=core.models.default_due_date),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='fine',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='overdue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['return_date', 'due_date', 'id'], name='loan_open_due_idx'),
+        ),
+    ]
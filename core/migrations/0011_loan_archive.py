@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# LoanHistory (core.models) is this view, not a table. Both SQLite and
+# PostgreSQL refuse some changes to a table a view reads, so a later
+# migration that alters core_loan or core_archivedloan drops the view
+# first (RunSQL(DROP_LOAN_HISTORY, CREATE_LOAN_HISTORY)) and creates it
+# again from the new columns at its end.
+LOAN_HISTORY_COLUMNS = 'id, user_id, book_id, loan_date, due_date, return_date, overdue, fine, updated_at'
+CREATE_LOAN_HISTORY = (
+    f'CREATE VIEW core_loanhistory AS '
+    f'SELECT {LOAN_HISTORY_COLUMNS}, FALSE AS archived FROM core_loan '
+    f'UNION ALL SELECT {LOAN_HISTORY_COLUMNS}, TRUE AS archived FROM core_archivedloan'
+)
+DROP_LOAN_HISTORY = 'DROP VIEW IF EXISTS core_loanhistory'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_loan_overdue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loan_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('overdue', models.BooleanField(default=False)),
+                ('fine', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name_plural': 'loan history',
+                'db_table': 'core_loanhistory',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('loan_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('return_date', models.DateField()),
+                ('overdue', models.BooleanField(default=False)),
+                ('fine', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='core.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'loan_date'], name='archived_user_date_idx'), models.Index(fields=['book', 'loan_date'], name='archived_book_date_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_LOAN_HISTORY, reverse_sql=DROP_LOAN_HISTORY),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:14
+
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_related_books'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchIndex',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='core.book')),
+                ('document', core.models.FtsDocumentField(db_column='core_book_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'core_book_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
 # core/models.py
 
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -26,6 +30,10 @@ class CustomUserManager(BaseUserManager):
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
+    # Embedded in JWTs; bumping it revokes every token issued before
+    token_version = models.PositiveIntegerField(default=0)
+    # Maintained by core.stats alongside loan creation/return
+    active_loans = models.PositiveIntegerField(default=0)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
@@ -41,15 +49,278 @@ class Book(models.Model):
     published_date = models.DateField(null=True, blank=True)
     genre = models.CharField(max_length=100, null=True, blank=True)
     available_copies = models.PositiveIntegerField(default=1)
+    # Incremented in the same UPDATE that takes a copy (core.loans.take_copy)
+    lifetime_loans = models.PositiveIntegerField(default=0, editable=False)
+    # Delta sync version (core/sync.py); UPDATEs that bypass save() set it too
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # One index per BookViewSet filter/ordering field, plus composites for
+        # the common "filter by X, ordered by title" listings
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['author', 'title'], name='book_author_title_idx'),
+            models.Index(fields=['genre', 'title'], name='book_genre_title_idx'),
+            models.Index(fields=['published_date'], name='book_published_idx'),
+            models.Index(fields=['available_copies'], name='book_available_idx'),
+            models.Index(fields=['-lifetime_loans', 'id'], name='book_lifetime_loans_idx'),
+            models.Index(fields=['updated_at', 'id'], name='book_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+def default_due_date():
+    return timezone.localdate() + timedelta(days=settings.LOAN_PERIOD_DAYS)
+
 class Loan(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='loans')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='loans')
     loan_date = models.DateField(auto_now_add=True)
+    due_date = models.DateField(default=default_due_date)
+    return_date = models.DateField(null=True, blank=True)
+    # Set by `manage.py process_overdue` (core/overdue.py) while the loan is open
+    overdue = models.BooleanField(default=False)
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    # Delta sync version (core/sync.py); UPDATEs that bypass save() set it too
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Per-user and per-book loan history ordered by date, the date filters
+        # from LoanViewSet, and a partial index covering only active loans
+        indexes = [
+            models.Index(fields=['user', 'loan_date'], name='loan_user_date_idx'),
+            models.Index(fields=['book', 'loan_date'], name='loan_book_date_idx'),
+            models.Index(fields=['loan_date'], name='loan_date_idx'),
+            models.Index(fields=['return_date'], name='loan_return_date_idx'),
+            models.Index(
+                fields=['user', 'book'],
+                condition=models.Q(return_date__isnull=True),
+                name='loan_active_idx',
+            ),
+            models.Index(fields=['updated_at', 'id'], name='loan_updated_idx'),
+            # The overdue job's walk: open loans in due date order. Leading
+            # with return_date (always NULL here) lets SQLite match the
+            # `return_date IS NULL` term to this index rather than to
+            # loan_return_date_idx, which would scan every open loan
+            models.Index(
+                fields=['return_date', 'due_date', 'id'],
+                condition=models.Q(return_date__isnull=True),
+                name='loan_open_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.book.title} (Loaned: {self.loan_date})"
+
+class GenreCirculation(models.Model):
+    """
+    Loans and returns per genre per day, maintained incrementally by
+    core.stats and rebuilt by `manage.py reconcile_stats`.
+    """
+    day = models.DateField()
+    genre = models.CharField(max_length=100, blank=True, default='')
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'genre'], name='unique_genre_circulation_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.genre or '(no genre)'}: {self.loans} out, {self.returns} back"
+
+class Hold(models.Model):
+    """
+    A user's place in a book's FIFO waiting queue. When a copy comes back,
+    core.loans hands it to the oldest waiting hold in the same transaction:
+    a Loan is created for the holder and the hold is marked fulfilled.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='holds')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    created = models.DateTimeField(auto_now_add=True)
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
+    loan = models.ForeignKey(Loan, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    class Meta:
+        # The queue is read head-first per book and only over waiting holds
+        indexes = [
+            models.Index(
+                fields=['book', 'created', 'id'],
+                condition=models.Q(fulfilled_at__isnull=True),
+                name='hold_queue_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(fulfilled_at__isnull=True),
+                name='unique_waiting_hold',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} waiting for {self.book_id} since {self.created}"
+
+class Change(models.Model):
+    """
+    One entry of the change feed (/api/changes/): the state of a book's
+    availability or of a loan after a committed write. The auto-increment
+    primary key is the sequence number clients resume from.
+    """
+    BOOK = 'book'
+    LOAN = 'loan'
+    KIND_CHOICES = [(BOOK, 'Book'), (LOAN, 'Loan')]
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Whose loan changed, so the feed can show users only their own loans
+    user_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id}"
+
+class Tombstone(models.Model):
+    """
+    Marks a deleted Book or Loan so delta sync clients (/api/sync/) can
+    drop their copy; deleted rows leave nothing else to compare against.
+    """
+    BOOK = 'book'
+    LOAN = 'loan'
+    KIND_CHOICES = [(BOOK, 'Book'), (LOAN, 'Loan')]
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # The loan's borrower, so users only sync their own loans' deletions
+    user_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at}"
+
+class JobCheckpoint(models.Model):
+    """
+    Where a batched background job got to, committed with each batch so
+    an interrupted run resumes instead of starting over.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    day = models.DateField()  # The run this position belongs to
+    position = models.JSONField(null=True, blank=True)  # Last key processed
+    done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} {self.day}: {'done' if self.done else self.position}"
+
+class ArchivedLoan(models.Model):
+    """
+    A returned loan moved out of the Loan table by `manage.py archive_loans`
+    (core/archive.py). It keeps the loan's id and columns, so it reads back
+    exactly as it was.
+    """
+    id = models.BigIntegerField(primary_key=True)  # The Loan's id
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_loans')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_date = models.DateField()
+    due_date = models.DateField()
+    return_date = models.DateField()
+    overdue = models.BooleanField(default=False)
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Per-user and per-book history, as on Loan
+        indexes = [
+            models.Index(fields=['user', 'loan_date'], name='archived_user_date_idx'),
+            models.Index(fields=['book', 'loan_date'], name='archived_book_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.book_id} (Loaned: {self.loan_date}, archived)"
+
+class LoanHistory(models.Model):
+    """
+    Read-only view over Loan and ArchivedLoan together (UNION ALL), for
+    ?include_archived=1 reads and recounts that must see every loan.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    loan_date = models.DateField()
+    due_date = models.DateField()
     return_date = models.DateField(null=True, blank=True)
+    overdue = models.BooleanField(default=False)
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField(default=False)
+
+    class Meta:
+        managed = False
+        db_table = 'core_loanhistory'
+        verbose_name_plural = 'loan history'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.book_id} (Loaned: {self.loan_date})"
+
+class FtsDocumentField(models.TextField):
+    """
+    The hidden FTS5 column named after its table, which stands for the
+    whole row: `<table> MATCH <query>` searches every indexed column.
+    """
+
+
+@FtsDocumentField.register_lookup
+class FtsMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class BookSearchIndex(models.Model):
+    """
+    The SQLite FTS5 table of book search text (migration 0004, kept in
+    sync by core.search); its rowid is the book id. Only used to join it
+    into Book queries: filter on search_index__document__match and read
+    the bm25 relevance from search_index__rank.
+    """
+    book = models.OneToOneField(
+        Book, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index',
+    )
+    document = FtsDocumentField(db_column='core_book_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_book_fts'
+
+class RelatedBook(models.Model):
+    """
+    One of a book's top RECOMMENDATIONS_TOP_K "borrowers also borrowed"
+    neighbours, precomputed by `manage.py build_recommendations`
+    (core/recommendations.py).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='related_books')
+    related = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()  # 1 = most co-borrowed
+    co_borrowers = models.PositiveIntegerField()  # Users who borrowed both books
+
+    class Meta:
+        # /api/books/<id>/related/ reads one book's neighbours in rank order
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_related_book_rank'),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.book.title} (Loaned: {self.loan_date})"
\ No newline at end of file
+        return f"{self.book_id} -> {self.related_id} (#{self.rank}, {self.co_borrowers} borrowers)"
@@ -0,0 +1,148 @@
+# core/overdue.py
+
+"""
+Overdue processing (`manage.py process_overdue`). Open loans past their
+due date are marked overdue and their fine set to OVERDUE_FINE_PER_DAY
+per day late, capped at OVERDUE_FINE_CAP.
+
+The job walks open loans in (due_date, id) order on the partial
+loan_open_due_idx index, OVERDUE_BATCH at a time. Each batch is a key
+range: one SELECT of its keys from the index and one UPDATE over the
+range, with no model instances or per-row writes. The fine comes from
+the due date alone, so re-running a batch writes the same values; rows
+that already hold them are skipped, which keeps their updated_at (and
+delta sync) quiet.
+
+The walk position is saved in a JobCheckpoint in the same transaction
+as each batch, so an interrupted run resumes where it stopped, and a
+finished run isn't repeated the same day.
+"""
+
+import time
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Case, DecimalField, Q, Value, When
+from django.utils import timezone
+
+from .models import JobCheckpoint, Loan
+
+JOB_NAME = 'process_overdue'
+
+
+def fine_expression(today):
+    """
+    CASE due_date WHEN ... THEN fine: one branch per day late until the
+    cap is reached, and the cap for everything older. The expression has
+    at most cap / rate + 1 branches, however many loans it covers. With no
+    daily rate, overdue loans are still marked but fined nothing.
+    """
+    rate, cap = fine_setting('OVERDUE_FINE_PER_DAY'), fine_setting('OVERDUE_FINE_CAP')
+    output_field = DecimalField(max_digits=8, decimal_places=2)
+    if not rate:
+        return Value(Decimal('0'), output_field=output_field)
+    whens = []
+    days = 1
+    while rate * days < cap:
+        whens.append(When(due_date=today - timedelta(days=days), then=Value(rate * days)))
+        days += 1
+    whens.append(When(due_date__lte=today - timedelta(days=days), then=Value(cap)))
+    return Case(*whens, default=Value(Decimal('0')), output_field=output_field)
+
+
+def fine_setting(name):
+    try:
+        value = Decimal(getattr(settings, name))
+    except (InvalidOperation, TypeError):
+        raise ImproperlyConfigured(f'{name} must be a decimal amount.')
+    if not value.is_finite() or value < 0:
+        raise ImproperlyConfigured(f'{name} must be zero or a positive amount.')
+    return value
+
+
+def after(key):
+    # Loans strictly after `key` in (due_date, id) order. The plain lower
+    # bound is what lets the index seek instead of scanning from the start
+    due, last_id = date.fromisoformat(key[0]), key[1]
+    return Q(due_date__gte=due) & (Q(due_date__gt=due) | Q(due_date=due, id__gt=last_id))
+
+
+def open_overdue(today):
+    return Loan.objects.filter(return_date__isnull=True, due_date__lt=today)
+
+
+def checkpoint_for(today, restart=False):
+    """
+    Returns today's checkpoint, starting a new one for a new day (or on
+    restart). The row is locked, so two runs can't walk at once.
+    """
+    checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(
+        name=JOB_NAME, defaults={'day': today}
+    )
+    if restart or checkpoint.day != today:
+        checkpoint.day, checkpoint.position, checkpoint.done = today, None, False
+        checkpoint.save()
+    return checkpoint
+
+
+def process_batch(today, batch_size, fine):
+    """
+    Processes the next batch after the saved position and returns
+    (loans in the batch, loans updated), or None once the walk is done.
+    """
+    with transaction.atomic():
+        checkpoint = checkpoint_for(today)
+        if checkpoint.done:
+            return None
+        pending = open_overdue(today)
+        if checkpoint.position is not None:
+            pending = pending.filter(after(checkpoint.position))
+        # The batch is the key range up to its last row
+        keys = list(pending.order_by('due_date', 'id').values_list('due_date', 'id')[:batch_size])
+        if not keys:
+            checkpoint.done = True
+            checkpoint.save()
+            return None
+        last = keys[-1]
+        # Bounded by `last` alone (it is before today): the index seeks one
+        # range bound per side, and today's would scan the rest of the walk
+        batch = Loan.objects.filter(return_date__isnull=True, due_date__lte=last[0]).exclude(
+            due_date=last[0], id__gt=last[1]
+        )
+        if checkpoint.position is not None:
+            batch = batch.filter(after(checkpoint.position))
+        updated = batch.exclude(overdue=True, fine=fine).update(overdue=True, fine=fine, updated_at=timezone.now())
+        checkpoint.position = [last[0].isoformat(), last[1]]
+        checkpoint.save()
+        return len(keys), updated
+
+
+def process_overdue(today=None, batch_size=None, restart=False, progress=None):
+    """
+    Runs (or resumes) today's pass and returns its totals: loans walked,
+    loans updated, batches and seconds. `progress` is called with the
+    running totals after each batch.
+    """
+    today = today or timezone.localdate()
+    batch_size = batch_size or settings.OVERDUE_BATCH
+    fine = fine_expression(today)
+    if restart:
+        with transaction.atomic():
+            checkpoint_for(today, restart=True)
+    totals = {'walked': 0, 'updated': 0, 'batches': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    while True:
+        result = process_batch(today, batch_size, fine)
+        if result is None:
+            break
+        totals['walked'] += result[0]
+        totals['updated'] += result[1]
+        totals['batches'] += 1
+        totals['seconds'] = time.perf_counter() - started
+        if progress:
+            progress(totals)
+    totals['seconds'] = time.perf_counter() - started
+    return totals
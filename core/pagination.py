@@ -0,0 +1,175 @@
+# core/pagination.py
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def cursor_value(value):
+    # Full-precision isoformat: DjangoJSONEncoder would truncate microseconds
+    # and the seek condition needs exact equality on the key
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'v': values, 'r': reverse}, default=cursor_value, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(payload)
+        return list(data['v']), bool(data['r'])
+    except (ValueError, KeyError, TypeError):
+        raise NotFound('Invalid cursor.')
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Opt-in keyset (seek) pagination. Viewsets enable it by setting
+    `pagination_class = KeysetPagination`; clients then page with
+    `?cursor=` (empty for the first page) and follow the `next`/`previous`
+    links. Requests without `cursor` keep the usual page-number behaviour,
+    which is what the browsable API and admin tooling use.
+
+    Pages are keyed on the active ordering (`?ordering=`, else the view's
+    `ordering`, else `id`) plus an `id` tiebreaker, so each page is a single
+    indexed range scan: no COUNT(*) and no OFFSET, however deep the page.
+    NULLs always sort last so nullable ordering fields page correctly.
+    Cursor mode replaces any queryset ordering (such as search relevance)
+    with this key ordering.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(request, queryset, view)
+
+        cursor = request.query_params[self.cursor_query_param]
+        values, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if values is not None and len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+
+        queryset = queryset.order_by(*self.order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, reverse))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Moving forward there is a previous page whenever we came from a
+        # cursor; moving backward there is always a next page
+        self.next_cursor = self.previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                self.next_cursor = encode_cursor(self.key(rows[-1]))
+            if (has_more and reverse) or (values is not None and not reverse):
+                self.previous_cursor = encode_cursor(self.key(rows[0]), reverse=True)
+        return rows
+
+    def get_keyset_ordering(self, request, queryset, view):
+        """
+        Returns [(field, descending, nullable), ...] ending with the id
+        tiebreaker.
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or []
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        keys = []
+        for term in ordering:
+            name = term.lstrip('-')
+            if name in ('id', 'pk'):
+                break
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                keys.append((field.attname, term.startswith('-'), field.null))
+        keys.append(('id', keys[0][1] if keys else False, False))
+        return keys
+
+    def order_by(self, reverse):
+        # NULLs sort last going forward, so first when walking backwards
+        terms = []
+        for name, descending, nullable in self.ordering:
+            nulls = ({'nulls_first': True} if reverse else {'nulls_last': True}) if nullable else {}
+            terms.append(F(name).desc(**nulls) if descending != reverse else F(name).asc(**nulls))
+        return terms
+
+    def seek(self, values, reverse):
+        """
+        Builds (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... honouring each
+        key's direction and NULLs-last placement. A redundant `k1 >= v1`
+        bound is ANDed in front so the planner can use k1's index as a range.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.ordering, values):
+            forward = descending == reverse
+            if value is None:
+                # Forward past a NULL only more NULLs follow (handled by the
+                # tiebreaker); backward, every non-NULL row comes first
+                step = Q(**{f'{name}__isnull': False}) if reverse else Q(pk__in=[])
+                condition |= equal & step
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            step = Q(**{f'{name}__{"gt" if forward else "lt"}': value})
+            if nullable and not reverse:
+                step |= Q(**{f'{name}__isnull': True})
+            condition |= equal & step
+            equal &= Q(**{name: value})
+
+        name, descending, nullable = self.ordering[0]
+        if values[0] is not None and not nullable:
+            bound = 'gte' if descending == reverse else 'lte'
+            condition = Q(**{f'{name}__{bound}': values[0]}) & condition
+        return condition
+
+    def key(self, obj):
+        # Rows are model instances, or dicts on the .values() fast path
+        if isinstance(obj, dict):
+            return [obj[name] for name, _, _ in self.ordering]
+        return [getattr(obj, name) for name, _, _ in self.ordering]
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        })
+
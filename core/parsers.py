@@ -0,0 +1,76 @@
+# core/parsers.py
+
+import codecs
+import csv
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def iter_jsonl(lines):
+    """
+    Yields (line_number, row) from JSON Lines text. Lines that aren't a JSON
+    object are yielded as (line_number, None) so callers can report them.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def iter_csv(lines):
+    """
+    Yields (line_number, row) from CSV text with a header row. Empty cells
+    are dropped so optional columns fall back to their model defaults.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {key: value for key, value in row.items() if key is not None and value != ''}
+
+
+def guarded(rows):
+    """
+    Lazily parsed bodies only fail once the view iterates them; this turns
+    those failures into a ParseError (400) instead of a 500.
+    """
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        raise ParseError('Request body is not valid UTF-8.')
+    except csv.Error as exc:
+        raise ParseError(f'Malformed CSV: {exc}')
+
+
+class JSONLinesParser(BaseParser):
+    """
+    Parses a JSON Lines body lazily, one row at a time, so large uploads are
+    never held in memory in full.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError('Empty request body.')
+        return guarded(iter_jsonl(codecs.iterdecode(stream, 'utf-8')))
+
+
+class JSONLParser(JSONLinesParser):
+    media_type = 'application/jsonl'
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a CSV body (header row required) lazily, one row at a time.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError('Empty request body.')
+        return guarded(iter_csv(codecs.iterdecode(stream, 'utf-8')))
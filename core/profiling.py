@@ -0,0 +1,197 @@
+# core/profiling.py
+
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_profile', default=None)
+
+# Upper bounds (seconds) of the request duration histogram on /metrics
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    """
+    Timings collected while one request is handled: seconds per phase
+    (auth, filter, serialize, ...) and every SQL statement with its duration.
+    """
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.queries = []
+        self._open = set()
+
+    @contextmanager
+    def phase(self, name):
+        # Nested entries into the same phase (e.g. nested serializers) are
+        # only timed at the outermost level
+        if name in self._open:
+            yield
+            return
+        self._open.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+            self._open.discard(name)
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - started))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def duplicate_queries(self):
+        """
+        Statements run more than once with identical parameters in this
+        request; each repeat after the first counts once.
+        """
+        seen = Counter((sql, params) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in seen.values())
+
+    @property
+    def similar_queries(self):
+        """
+        Repeats of the same statement with different parameters: the
+        signature of an N+1 loop.
+        """
+        seen = Counter(sql for sql, _, _ in self.queries)
+        return sum(count - 1 for count in seen.values()) - self.duplicate_queries
+
+
+def current_profile():
+    return _current.get()
+
+
+@contextmanager
+def profiling(profile):
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """
+    Times the enclosed block under `name` when a request is being profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.phase(name):
+        yield
+
+
+class ProfiledSerializerMixin:
+    """
+    Counts time spent turning instances into primitives as the `serialize`
+    phase. Costs one context variable lookup when profiling is off.
+    """
+    def to_representation(self, instance):
+        profile = _current.get()
+        if profile is None:
+            return super().to_representation(instance)
+        with profile.phase('serialize'):
+            return super().to_representation(instance)
+
+
+class ProfiledViewMixin:
+    """
+    Times the filter backends of a DRF view as the `filter` phase.
+    """
+    def filter_queryset(self, queryset):
+        with phase('filter'):
+            return super().filter_queryset(queryset)
+
+
+class MetricsRegistry:
+    """
+    Per-process request metrics, rendered in the Prometheus text format.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter()  # (view, method, status)
+            self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))  # (view, method)
+            self.duration_sum = Counter()
+            self.duration_count = Counter()
+            self.phase_seconds = Counter()  # (view, phase)
+            self.sql_queries = Counter()  # view
+            self.sql_seconds = Counter()
+            self.sql_duplicates = Counter()
+
+    def observe(self, view, method, status, duration, profile):
+        key = (view, method)
+        with self._lock:
+            self.requests[(view, method, str(status))] += 1
+            buckets = self.duration_buckets[key]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            self.duration_sum[key] += duration
+            self.duration_count[key] += 1
+            for name, seconds in profile.phases.items():
+                self.phase_seconds[(view, name)] += seconds
+            self.sql_queries[view] += len(profile.queries)
+            self.sql_seconds[view] += profile.sql_time
+            self.sql_duplicates[view] += profile.duplicate_queries
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(sample_line(name, labels, value) for labels, value in samples)
+
+        with self._lock:
+            family('library_http_requests_total', 'counter', 'Requests handled, by view, method and status.',
+                   [((('view', v), ('method', m), ('status', s)), n) for (v, m, s), n in sorted(self.requests.items())])
+
+            name = 'library_http_request_duration_seconds'
+            lines.append(f'# HELP {name} Request duration, measured by the profiling middleware.')
+            lines.append(f'# TYPE {name} histogram')
+            for key, buckets in sorted(self.duration_buckets.items()):
+                labels = (('view', key[0]), ('method', key[1]))
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(sample_line(f'{name}_bucket', (*labels, ('le', repr(bound))), count))
+                lines.append(sample_line(f'{name}_bucket', (*labels, ('le', '+Inf')), self.duration_count[key]))
+                lines.append(sample_line(f'{name}_sum', labels, round(self.duration_sum[key], 6)))
+                lines.append(sample_line(f'{name}_count', labels, self.duration_count[key]))
+
+            family('library_request_phase_seconds_total', 'counter', 'Seconds spent per request phase.',
+                   [((('view', v), ('phase', p)), round(s, 6)) for (v, p), s in sorted(self.phase_seconds.items())])
+            family('library_sql_queries_total', 'counter', 'SQL statements executed.',
+                   [((('view', v),), n) for v, n in sorted(self.sql_queries.items())])
+            family('library_sql_seconds_total', 'counter', 'Seconds spent in SQL.',
+                   [((('view', v),), round(s, 6)) for v, s in sorted(self.sql_seconds.items())])
+            family('library_sql_duplicate_queries_total', 'counter',
+                   'SQL statements repeated with identical parameters within one request.',
+                   [((('view', v),), n) for v, n in sorted(self.sql_duplicates.items())])
+        return '\n'.join(lines) + '\n'
+
+
+def sample_line(name, labels, value):
+    label_text = ','.join(f'{key}="{escape(str(val))}"' for key, val in labels)
+    return f'{name}{{{label_text}}} {value}'
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,205 @@
+# core/recommendations.py
+
+"""
+"Borrowers also borrowed" recommendations (`manage.py
+build_recommendations`, served by /api/books/<id>/related/).
+
+Two books are related by how many users borrowed both, counted over
+every loan, archived ones included, with repeat loans of a book counted
+once. The job streams (user, book) pairs RECOMMENDATIONS_CHUNK_USERS
+users at a time. Each chunk adds its users' co-borrowing to the counts
+for the books being refreshed, so memory holds one chunk of pairs and the
+counts. With NumPy and SciPy installed, a chunk is a sparse user x book
+matrix X and its contribution is X[:, rows].T @ X. Without them, a
+pure-Python loop over each user's books does the same.
+
+Only each book's top RECOMMENDATIONS_TOP_K neighbours are kept, as
+RelatedBook rows, so a request is one lookup on (book, rank).
+
+Refreshes are incremental. A JobCheckpoint holds the highest loan id
+already counted. New loans only change the rows of the books their
+borrowers have ever borrowed, so only those rows are recounted, and
+only from those books' borrowers. Deleted loans are not subtracted until
+the next `--full` build.
+"""
+
+import heapq
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Book, CustomUser, JobCheckpoint, Loan, LoanHistory, RelatedBook
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional; CoBorrowCounter does the same in pure Python
+    np = sparse = None
+
+JOB_NAME = 'recommendations'
+
+
+def neighbours(pairs, k):
+    # The k best (related book, count) pairs: most co-borrowers first, then lowest id
+    return heapq.nsmallest(k, pairs, key=lambda pair: (-pair[1], pair[0]))
+
+
+class CoBorrowCounter:
+    """
+    Co-borrower counts for the books in `rows` (None for every book),
+    fed one chunk of (user, book) pairs at a time. A chunk must hold each
+    of its users' pairs in full.
+    """
+    def __init__(self, rows=None):
+        self.rows = rows
+        self.counts = defaultdict(Counter)
+
+    def add(self, pairs):
+        baskets = defaultdict(set)
+        for user_id, book_id in pairs:
+            baskets[user_id].add(book_id)
+        for basket in baskets.values():
+            for book_id in (basket if self.rows is None else basket & self.rows):
+                self.counts[book_id].update(basket)
+
+    def top(self, k):
+        # {book: [(related, count), ...]} for every counted book
+        return {
+            book_id: neighbours([(other, n) for other, n in counts.items() if other != book_id], k)
+            for book_id, counts in self.counts.items()
+        }
+
+
+class SparseCoBorrowCounter(CoBorrowCounter):
+    """
+    CoBorrowCounter on SciPy sparse matrices: each chunk is a binary
+    user x book matrix X, and the counts grow by X[:, rows].T @ X.
+    """
+    def __init__(self, rows=None):
+        super().__init__(rows)
+        self.books = np.fromiter(Book.objects.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+        if rows is None:
+            self.row_ids = self.books
+        else:
+            self.row_ids = np.intersect1d(self.books, np.fromiter(rows, dtype=np.int64, count=len(rows)))
+        self.row_columns = np.searchsorted(self.books, self.row_ids)
+        self.matrix = sparse.csr_matrix((len(self.row_ids), len(self.books)), dtype=np.int32)
+
+    def add(self, pairs):
+        if not pairs or not len(self.books):
+            return
+        users, book_ids = np.array(pairs, dtype=np.int64).T
+        columns = np.searchsorted(self.books, book_ids)
+        # Drop books created after the book list was read
+        known = (columns < len(self.books)) & (self.books[np.minimum(columns, len(self.books) - 1)] == book_ids)
+        users, columns = np.unique(users[known], return_inverse=True)[1], columns[known]
+        if not len(columns):
+            return
+        chunk = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (users, columns)), shape=(users.max() + 1, len(self.books))
+        )
+        chunk.data[:] = 1  # A pair listed twice is still one borrower
+        self.matrix = self.matrix + (chunk[:, self.row_columns].T @ chunk).tocsr()
+
+    def top(self, k):
+        result = {}
+        matrix = self.matrix.tocsr()
+        for row, book_id in enumerate(self.row_ids.tolist()):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == end:
+                continue
+            related, counts = self.books[matrix.indices[start:end]], matrix.data[start:end]
+            keep = related != book_id
+            result[book_id] = neighbours(zip(related[keep].tolist(), counts[keep].tolist()), k)
+        return result
+
+
+def counter(rows=None):
+    return (SparseCoBorrowCounter if sparse is not None else CoBorrowCounter)(rows)
+
+
+def user_ranges(chunk_size):
+    # (first, last) user ids of consecutive chunks of `chunk_size` users
+    last = 0
+    while True:
+        ids = list(CustomUser.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last = ids[-1]
+
+
+def stale_books(since, until):
+    """
+    Books whose neighbours change with the loans in (since, until]: every
+    book ever borrowed by one of their borrowers (as a subquery).
+    """
+    borrowers = Loan.objects.filter(id__gt=since, id__lte=until).values('user_id')
+    return LoanHistory.objects.filter(user_id__in=borrowers).values('book_id')
+
+
+def store(top, rows):
+    """
+    Replaces the RelatedBook rows of `rows` (every book when None) with
+    `top`, in one transaction.
+    """
+    with transaction.atomic():
+        if rows is None:
+            RelatedBook.objects.all().delete()
+        else:
+            ids = sorted(rows)
+            for start in range(0, len(ids), 1000):
+                RelatedBook.objects.filter(book_id__in=ids[start:start + 1000]).delete()
+        RelatedBook.objects.bulk_create(
+            (
+                RelatedBook(book_id=book_id, related_id=related_id, rank=rank, co_borrowers=count)
+                for book_id, related in top.items()
+                for rank, (related_id, count) in enumerate(related, 1)
+            ),
+            batch_size=1000,
+        )
+
+
+def build_recommendations(full=False, chunk_users=None, progress=None):
+    """
+    Recounts the neighbours of every book (full, or on the first run) or
+    of the books that loans since the last run affect, and returns the
+    totals: books refreshed (those borrowed at all), pairs read, chunks,
+    seconds and whether the run was full. `progress` is called with the
+    running totals after each chunk.
+    """
+    chunk_users = chunk_users or settings.RECOMMENDATIONS_CHUNK_USERS
+    started = time.perf_counter()
+    until = Loan.objects.aggregate(last=Max('id'))['last'] or 0
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=JOB_NAME, defaults={'day': timezone.localdate()})
+    full = full or checkpoint.position is None
+    stale = None if full else stale_books(checkpoint.position, until)
+    rows = None if full else set(stale.distinct().values_list('book_id', flat=True))
+    totals = {'books': 0, 'pairs': 0, 'chunks': 0, 'seconds': 0.0, 'full': full}
+
+    if rows is None or rows:
+        counts = counter(rows)
+        history = LoanHistory.objects.all()
+        if rows is not None:
+            # Only these books' borrowers add to their counts
+            history = history.filter(user_id__in=LoanHistory.objects.filter(book_id__in=stale).values('user_id'))
+        for first, last in user_ranges(chunk_users):
+            pairs = list(history.filter(user_id__gte=first, user_id__lte=last).values_list('user_id', 'book_id').distinct())
+            counts.add(pairs)
+            totals['pairs'] += len(pairs)
+            totals['chunks'] += 1
+            totals['seconds'] = time.perf_counter() - started
+            if progress:
+                progress(totals)
+        top = counts.top(settings.RECOMMENDATIONS_TOP_K)
+        store(top, rows)
+        totals['books'] = len(top)
+
+    checkpoint.day, checkpoint.position, checkpoint.done = timezone.localdate(), until, True
+    checkpoint.save()
+    totals['seconds'] = time.perf_counter() - started
+    return totals
@@ -0,0 +1,58 @@
+# core/renderers.py
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional; ORJSONRenderer falls back to the json module
+    orjson = None
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Content-negotiation target for streaming export actions. The actions
+    return a StreamingHttpResponse themselves; this renderer only ever sees
+    error payloads (403, 404, ...), which it renders as JSON text.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONLinesRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    DRF's JSONRenderer with orjson doing the encoding, producing the same
+    bytes for compact output: datetimes and anything else orjson doesn't
+    know natively go through DRF's encoder, and U+2028/U+2029 are escaped
+    the same way. Indented output (e.g. ?indent=), ASCII-only or
+    non-strict settings, and a missing orjson use the parent renderer.
+    """
+    OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.OPTIONS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the json module handles
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
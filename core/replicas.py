@@ -0,0 +1,141 @@
+# core/replicas.py
+
+"""
+Read replicas. With DATABASE_REPLICA_URLS set, safe-method requests to
+the catalogue and user endpoints (views using ReplicaReadMixin) read from
+one replica, picked per request so a page and its count agree; every
+write, and every other view, stays on the primary.
+
+Replicas lag the primary, so a user who just borrowed or returned a book
+would otherwise see the old availability. Each successful write pins
+its user to the primary for REPLICA_STICKY_SECONDS. The pin travels with
+the client, not in any one process: the response carries it, signed with
+the user id and the time of the write, as the `replica_pin` cookie and
+the X-Replica-Pin header. Browsers send the cookie back on their own;
+API clients that don't keep cookies echo the header. Whichever worker
+serves the next request can then verify it without shared state.
+"""
+
+import math
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'replica_pin'
+PIN_HEADER = 'X-Replica-Pin'
+
+_replica = ContextVar('read_replica', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def current_replica():
+    return _replica.get()
+
+
+@contextmanager
+def using_replica(alias):
+    token = _replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _replica.reset(token)
+
+
+def pin_signer():
+    return signing.TimestampSigner(salt='core.replicas.pin')
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def pin_to_primary(request, response):
+    """
+    Adds the requesting user's signed pin to `response`.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or not replica_aliases():
+        return
+    pin = pin_signer().sign(str(user.pk))
+    response.set_cookie(
+        PIN_COOKIE, pin, max_age=math.ceil(sticky_seconds()), httponly=True, samesite='Lax', secure=request.is_secure()
+    )
+    response[PIN_HEADER] = pin
+
+
+def is_pinned(request):
+    """
+    Whether the request carries a pin, issued to its own user no more than
+    REPLICA_STICKY_SECONDS ago.
+    """
+    user = getattr(request, 'user', None)
+    if not replica_aliases() or user is None or not user.is_authenticated:
+        return False
+    pin = request.headers.get(PIN_HEADER) or request.COOKIES.get(PIN_COOKIE)
+    if not pin:
+        return False
+    try:
+        return pin_signer().unsign(pin, max_age=sticky_seconds()) == str(user.pk)
+    except signing.BadSignature:  # Tampered with, or expired
+        return False
+
+
+def pick_replica(request):
+    """
+    The replica alias this request reads from, or None for the primary.
+    """
+    aliases = replica_aliases()
+    if not aliases or request.method not in SAFE_METHODS or is_pinned(request):
+        return None
+    return random.choice(aliases)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request, if any.
+    Writes always go to the primary (the `default` alias).
+    """
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class PinAfterWriteMixin:
+    """
+    Pins the requesting user to the primary after a successful write.
+    """
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaReadMixin(PinAfterWriteMixin):
+    """
+    Serves the view's safe-method requests from a replica, unless the user
+    is pinned to the primary by a recent write.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication runs in super().initial(), so the user is known here
+        super().initial(request, *args, **kwargs)
+        _replica.set(pick_replica(request))
@@ -0,0 +1,144 @@
+# core/search.py
+
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+from .models import Book
+
+# Columns indexed for full-text search, in BookViewSet.search_fields order
+SEARCH_FIELDS = ('title', 'author', 'isbn', 'genre')
+FTS_TABLE = 'core_book_fts'
+
+
+def search_tokens(terms):
+    """
+    Splits DRF search terms into plain word tokens, dropping any characters
+    that would be interpreted as FTS query syntax.
+    """
+    return [token.lower() for term in terms for token in re.findall(r'\w+', term)]
+
+
+class BookSearchBackend:
+    """
+    Base class for book search backends. `search` returns the queryset
+    narrowed to matching books and, when ranking is supported, ordered by
+    relevance (best first).
+    """
+    def search(self, queryset, tokens):
+        raise NotImplementedError
+
+
+class PostgresBookSearch(BookSearchBackend):
+    """
+    Uses the generated `search_vector` tsvector column and its GIN index.
+    Every token is prefix-matched so partial words still find books.
+    """
+    def search(self, queryset, tokens):
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        table = Book._meta.db_table
+        matches = RawSQL(
+            f"{table}.search_vector @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f"ts_rank({table}.search_vector, to_tsquery('english', %s))", [tsquery], output_field=FloatField()
+        )
+        return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+
+class SqliteFtsBookSearch(BookSearchBackend):
+    """
+    Joins the FTS5 table kept in sync by core.signals (BookSearchIndex) on
+    rowid = book id: one MATCH finds the books, and its built-in `rank`
+    column gives each one's bm25 score (lower is more relevant).
+    """
+    def search(self, queryset, tokens):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.filter(search_index__document__match=match).annotate(
+            search_rank=F('search_index__rank')
+        ).order_by('search_rank', 'id')
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresBookSearch,
+    'sqlite': SqliteFtsBookSearch,
+}
+
+
+def get_search_backend(using='default'):
+    """
+    Resolves settings.BOOK_SEARCH_BACKEND: 'auto' picks the backend for the
+    database vendor, 'icontains' keeps DRF's default scan, anything else is
+    a dotted path to a BookSearchBackend subclass. Returns None for the
+    icontains fallback.
+    """
+    choice = getattr(settings, 'BOOK_SEARCH_BACKEND', 'auto')
+    if choice == 'icontains':
+        return None
+    if choice == 'auto':
+        backend_class = VENDOR_BACKENDS.get(connections[using].vendor)
+        return backend_class() if backend_class else None
+    return import_string(choice)()
+
+
+class BookSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on BookViewSet: same `?search=`
+    parameter, but served by the full-text backend with relevance ordering.
+    An explicit `?ordering=` still wins, since OrderingFilter runs after.
+    """
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        tokens = search_tokens(self.get_search_terms(request))
+        if not tokens:
+            return queryset
+        return backend.search(queryset, tokens)
+
+
+def index_books(books, using='default'):
+    """
+    Writes the given books into the SQLite FTS table. A no-op on other
+    databases, where the index is maintained by the database itself.
+    """
+    rows = [(book.pk, *(getattr(book, field) for field in SEARCH_FIELDS)) for book in books]
+    write_index_rows(rows, using)
+
+
+def index_book_queryset(queryset):
+    """
+    Re-indexes every book in `queryset`, for writes that bypass signals such
+    as bulk_create. Reads only the search columns, without building models.
+    """
+    if connections[queryset.db].vendor != 'sqlite':
+        return
+    write_index_rows(list(queryset.values_list('id', *SEARCH_FIELDS)), queryset.db)
+
+
+def write_index_rows(rows, using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not rows:
+        return
+    rows = [(pk, *(value or '' for value in values)) for pk, *values in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s)', rows
+        )
+
+
+def unindex_books(book_ids, using='default'):
+    """
+    Removes books from the SQLite FTS table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in book_ids])
@@ -1,6 +1,11 @@
 # core/serializers.py
 from rest_framework import serializers
-from .models import CustomUser, Book, Loan
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import CustomUser, Book, Loan, Hold
+from .profiling import ProfiledSerializerMixin
+from .sparse import SparseFieldsMixin
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -44,22 +49,87 @@ class ChangePasswordSerializer(serializers.Serializer):
             raise serializers.ValidationError("Your old password was entered incorrectly.")
         return value
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class LibraryTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Adds the claims core.authentication.ClaimsJWTAuthentication trusts, so
+    authenticated requests don't need to fetch the user.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        token['token_version'] = user.token_version
+        return token
+
+class LibraryTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses refresh tokens issued before the user's tokens were revoked.
+    """
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if 'token_version' in refresh:
+            current = CustomUser.objects.filter(pk=refresh['user_id']).values_list('token_version', flat=True).first()
+            if current is None or refresh['token_version'] < current:
+                raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return super().validate(attrs)
+
+class CustomUserSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
-        fields = ('id', 'email', 'first_name', 'last_name', 'is_staff', 'date_joined')
-        read_only_fields = ('is_staff', 'date_joined')
+        fields = ('id', 'email', 'first_name', 'last_name', 'is_staff', 'date_joined', 'active_loans')
+        read_only_fields = ('is_staff', 'date_joined', 'active_loans')
+
+class BookSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        exclude = ('updated_at',)  # Internal delta sync version (core/sync.py)
 
-class BookSerializer(serializers.ModelSerializer):
+class BookImportSerializer(serializers.ModelSerializer):
+    """
+    Row validator for bulk imports. ISBN uniqueness is checked once per batch
+    (and resolved as an upsert) instead of one query per row.
+    """
     class Meta:
         model = Book
-        fields = '__all__'
+        fields = ('title', 'author', 'isbn', 'published_date', 'genre', 'available_copies')
+        extra_kwargs = {'isbn': {'validators': []}}
 
-class LoanSerializer(serializers.ModelSerializer):
+class LoanSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.ReadOnlyField(source='user.email')
     book_title = serializers.ReadOnlyField(source='book.title')
 
     class Meta:
         model = Loan
-        fields = '__all__'
-        read_only_fields = ('loan_date',) 
\ No newline at end of file
+        exclude = ('updated_at',)  # Internal delta sync version (core/sync.py)
+        read_only_fields = ('loan_date', 'due_date', 'overdue', 'fine')
+
+    def get_extra_kwargs(self):
+        # A loan's book and borrower are fixed once it exists: moving either
+        # would bypass take_copy/put_back_copy. Borrow or return instead.
+        extra_kwargs = super().get_extra_kwargs()
+        if isinstance(self.instance, Loan):
+            for name in ('book', 'user'):
+                extra_kwargs.setdefault(name, {})['read_only'] = True
+        return extra_kwargs
+
+    def validate_return_date(self, value):
+        if value is None and isinstance(self.instance, Loan) and self.instance.return_date is not None:
+            raise serializers.ValidationError('A returned loan cannot be reopened; borrow the book again instead.')
+        return value
+
+
+class HoldSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    # Queue position among waiting holds (1 = next in line); null once fulfilled
+    position = serializers.SerializerMethodField()
+    queue_length = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Hold
+        fields = ('id', 'book', 'created', 'fulfilled_at', 'loan', 'position', 'queue_length')
+        read_only_fields = fields
+
+    def get_position(self, hold):
+        return self.context.get('position')
+
+    def get_queue_length(self, hold):
+        return self.context.get('queue_length')
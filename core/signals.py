@@ -0,0 +1,68 @@
+# core/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import changes
+from .authentication import revoke_tokens
+from .cache import invalidate_catalogue
+from .models import Book, CustomUser, Loan, Tombstone
+from .search import SEARCH_FIELDS, index_books, unindex_books
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, using, update_fields=None, **kwargs):
+    invalidate_catalogue()
+    changes.books_changed([instance.pk])
+    # Saves that only touch e.g. available_copies don't change search text
+    if update_fields and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_books([instance], using=using)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, using, **kwargs):
+    invalidate_catalogue()
+    changes.books_changed([instance.pk])
+    unindex_books([instance.pk], using=using)
+    Tombstone.objects.using(using).create(kind=Tombstone.BOOK, object_id=instance.pk)
+
+
+# Fields ClaimsJWTAuthentication trusts from the token: changing either
+# revokes every token issued before. So does a new password, but only one
+# set with set_password(); check_password()'s silent rehash on login
+# leaves the password the same and keeps the user's tokens.
+TOKEN_FIELDS = ('is_staff', 'is_active')
+
+
+@receiver(pre_save, sender=CustomUser)
+def detect_token_fields_change(sender, instance, raw, using, update_fields=None, **kwargs):
+    instance._revoke_tokens = False
+    if raw or instance._state.adding:
+        return
+    fields = set(TOKEN_FIELDS) if update_fields is None else set(update_fields) & set(TOKEN_FIELDS)
+    # AbstractBaseUser keeps the raw password from set_password() until the
+    # save completes; the rehash setter clears it before saving
+    if instance._password is not None and (update_fields is None or 'password' in update_fields):
+        instance._revoke_tokens = True
+    elif fields:
+        previous = sender.objects.using(using).filter(pk=instance.pk).values(*fields).first()
+        instance._revoke_tokens = previous is not None and any(
+            previous[name] != getattr(instance, name) for name in fields
+        )
+
+
+# After the save, whatever path it came through (admin, shell, a view), so
+# no caller has to remember to revoke
+@receiver(post_save, sender=CustomUser)
+def revoke_stale_tokens(sender, instance, created, raw, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        revoke_tokens(instance)
+
+
+# Per loan, including those cascading from a book or user delete, which
+# therefore no longer fast-delete; they're rare admin operations
+@receiver(post_delete, sender=Loan)
+def tombstone_loan(sender, instance, using, **kwargs):
+    Tombstone.objects.using(using).create(kind=Tombstone.LOAN, object_id=instance.pk, user_id=instance.user_id)
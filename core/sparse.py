@@ -0,0 +1,119 @@
+# core/sparse.py
+
+"""
+Sparse fieldsets: `?fields=id,title` keeps only the named fields of a read
+response and `?exclude=isbn,genre` drops some. The view then loads only
+the columns the remaining fields read (plus the primary key and ordering
+keys), so trimming the payload also trims the query. Requests without
+either parameter, and all writes, are served exactly as before.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def requested_names(request, param):
+    value = request.query_params.get(param, '')
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def is_sparse(request):
+    return request is not None and request.method in SAFE_METHODS and bool(
+        requested_names(request, FIELDS_PARAM) or requested_names(request, EXCLUDE_PARAM)
+    )
+
+
+class SparseFieldsMixin:
+    """
+    Serializer half: trims `fields` to the request's ?fields= / ?exclude=
+    on GET and HEAD. Unknown names are a 400 rather than silently ignored.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not is_sparse(request):
+            return fields
+        wanted = requested_names(request, FIELDS_PARAM)
+        excluded = requested_names(request, EXCLUDE_PARAM)
+        for param, names in ((FIELDS_PARAM, wanted), (EXCLUDE_PARAM, excluded)):
+            unknown = [name for name in names if name not in fields]
+            if unknown:
+                raise ValidationError({param: [f'Unknown field(s): {", ".join(unknown)}.']})
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        return {name: field for name, field in fields.items() if name not in excluded}
+
+
+def ordering_columns(view, request, queryset):
+    """
+    Columns (attnames) of the model fields the response is ordered by:
+    keyset cursors read them from each row.
+    """
+    ordering = None
+    for backend in getattr(view, 'filter_backends', []):
+        if issubclass(backend, OrderingFilter):
+            ordering = backend().get_ordering(request, queryset, view)
+            break
+    ordering = ordering or getattr(view, 'ordering', None) or []
+    if isinstance(ordering, str):
+        ordering = [ordering]
+    columns = []
+    for term in ordering:
+        try:
+            field = queryset.model._meta.get_field(term.lstrip('-'))
+        except (FieldDoesNotExist, AttributeError):
+            continue
+        if field.concrete and not field.many_to_many:
+            columns.append(field.attname)
+    return columns
+
+
+def only_columns(queryset, fields, extra=()):
+    """
+    Narrows `queryset` to the columns behind `fields` (serializer fields,
+    possibly reaching one relation deep, e.g. source='user.email') and the
+    `extra` columns. Joins are kept for the relations still read and
+    dropped for the rest. Returns the queryset unchanged if any field reads
+    something other than a model field.
+    """
+    opts = queryset.model._meta
+    columns, related = {opts.pk.name}, set()
+    for field in fields.values():
+        attrs = field.source_attrs
+        if not attrs or len(attrs) > 2:
+            return queryset
+        try:
+            model_field = opts.get_field(attrs[0])
+            if len(attrs) == 2:
+                if not model_field.many_to_one:
+                    return queryset
+                model_field.related_model._meta.get_field(attrs[1])
+                related.add(attrs[0])
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.many_to_many or model_field.one_to_many:
+            return queryset
+        columns.add('__'.join(attrs))
+    columns.update(extra)
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(columns))
+
+
+class SparseQuerysetMixin:
+    """
+    View half: on sparse requests, loads only what the trimmed serializer
+    reads. List views on the .values() fast path select the same columns.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not is_sparse(self.request):
+            return queryset
+        fields = {name: field for name, field in self.get_serializer().fields.items() if not field.write_only}
+        return only_columns(queryset, fields, ordering_columns(self, self.request, queryset))
@@ -0,0 +1,79 @@
+# core/sqlite.py
+
+"""
+In-process write queue for SQLite deployments (SQLITE_WRITE_QUEUE=1).
+
+SQLite allows one writer at a time. With many threads writing, each
+transaction waits on the file lock through the busy handler, which polls
+with growing sleeps, so throughput collapses and slow waiters time out.
+Funnelling a process's loan and book writes through one thread, which
+owns one connection, turns that into an orderly queue: writes run back
+to back and waiting threads are woken the moment theirs commits. Other
+processes still take turns through the busy timeout (see the
+SQLITE_PRODUCTION settings).
+
+A write already inside a transaction runs inline on the caller's
+connection, since the writer thread could not see its uncommitted rows.
+"""
+
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_local = threading.local()
+_writer = None
+
+
+def write_queue():
+    """
+    Returns the single-thread executor writes are queued on, creating it
+    on first use, or None when the queue is off or the database isn't
+    SQLite.
+    """
+    global _writer
+    if not getattr(settings, 'SQLITE_WRITE_QUEUE', False) or connection.vendor != 'sqlite':
+        return None
+    with _lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(1, thread_name_prefix='sqlite-writer')
+        return _writer
+
+
+@receiver(setting_changed)
+def reset_write_queue(*, setting, **kwargs):
+    global _writer
+    if setting == 'SQLITE_WRITE_QUEUE':
+        with _lock:
+            if _writer is not None:
+                _writer.shutdown(wait=True)
+            _writer = None
+
+
+def _run_on_writer(func, *args, **kwargs):
+    # Like a request: drop the connection if it broke or outlived CONN_MAX_AGE
+    close_old_connections()
+    _local.writer = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.writer = False
+
+
+def serialized_write(func):
+    """
+    Runs `func` on the writer thread when the write queue is on, and
+    returns its result (or raises its exception) in the calling thread.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        writer = None if getattr(_local, 'writer', False) or connection.in_atomic_block else write_queue()
+        if writer is None:
+            return func(*args, **kwargs)
+        return writer.submit(_run_on_writer, func, *args, **kwargs).result()
+    return wrapper
@@ -0,0 +1,108 @@
+# core/stats.py
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Book, CustomUser, GenreCirculation
+
+
+def genre_of(book_id):
+    return Book.objects.filter(pk=book_id).values_list('genre', flat=True).first() or ''
+
+
+def count_circulation(day, genre, loans=0, returns=0):
+    """
+    Adds to the (day, genre) circulation row with an in-place UPDATE,
+    creating the row on first use. A concurrent creator losing the race on
+    the unique constraint falls back to the UPDATE.
+    """
+    rows = GenreCirculation.objects.filter(day=day, genre=genre)
+    changes = {'loans': F('loans') + loans, 'returns': F('returns') + returns}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            GenreCirculation.objects.create(day=day, genre=genre, loans=loans, returns=returns)
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def loan_opened(loan):
+    """
+    Counts a new loan. Call inside the loan's transaction; the book's
+    lifetime_loans is already bumped by core.loans.take_copy.
+    """
+    CustomUser.objects.filter(pk=loan.user_id).update(active_loans=F('active_loans') + 1)
+    count_circulation(loan.loan_date, genre_of(loan.book_id), loans=1)
+
+
+def loan_closed(loan, returned=True):
+    """
+    Uncounts an active loan: a return (counted in circulation) or, with
+    returned=False, an open loan being deleted.
+    """
+    CustomUser.objects.filter(pk=loan.user_id, active_loans__gt=0).update(active_loans=F('active_loans') - 1)
+    if returned:
+        count_circulation(loan.return_date, genre_of(loan.book_id), returns=1)
+
+
+def loan_deleted(loan):
+    """
+    Uncounts a loan that is being deleted, open or returned, so the
+    counters keep matching what reconcile_stats recounts from the loans
+    that remain: the user's active loan, the book's lifetime_loans and the
+    circulation rows of its loan and return days.
+    """
+    if loan.return_date is None:
+        loan_closed(loan, returned=False)
+    Book.objects.filter(pk=loan.book_id, lifetime_loans__gt=0).update(
+        lifetime_loans=F('lifetime_loans') - 1, updated_at=timezone.now()
+    )
+    genre = genre_of(loan.book_id)
+    GenreCirculation.objects.filter(day=loan.loan_date, genre=genre, loans__gt=0).update(loans=F('loans') - 1)
+    if loan.return_date is not None:
+        GenreCirculation.objects.filter(day=loan.return_date, genre=genre, returns__gt=0).update(
+            returns=F('returns') - 1
+        )
+
+
+def per_row(counts):
+    # CASE pk WHEN a THEN n ... so one UPDATE can add a different amount per row
+    return Case(*(When(pk=pk, then=Value(n)) for pk, n in counts.items()), default=Value(0),
+                output_field=IntegerField())
+
+
+def count_circulation_for(loans, day_field, column):
+    genres = dict(Book.objects.filter(pk__in={loan.book_id for loan in loans}).values_list('pk', 'genre'))
+    per_day = Counter((getattr(loan, day_field), genres.get(loan.book_id) or '') for loan in loans)
+    for (day, genre), n in per_day.items():
+        count_circulation(day, genre, **{column: n})
+
+
+def loans_opened(loans):
+    """
+    Bulk loan_opened: one UPDATE for the users' active_loans and one
+    circulation upsert per (day, genre).
+    """
+    if not loans:
+        return
+    counts = Counter(loan.user_id for loan in loans)
+    CustomUser.objects.filter(pk__in=counts).update(active_loans=F('active_loans') + per_row(counts))
+    count_circulation_for(loans, 'loan_date', 'loans')
+
+
+def loans_closed(loans):
+    """
+    Bulk loan_closed for returned loans.
+    """
+    if not loans:
+        return
+    counts = Counter(loan.user_id for loan in loans)
+    CustomUser.objects.filter(pk__in=counts).update(
+        active_loans=Greatest(F('active_loans') - per_row(counts), Value(0))
+    )
+    count_circulation_for(loans, 'return_date', 'returns')
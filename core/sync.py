@@ -0,0 +1,146 @@
+# core/sync.py
+
+"""
+Delta sync for offline clients (GET /api/sync/). Book and Loan rows carry
+an `updated_at` version, deletions leave a Tombstone, and a sync token
+records how far a client got, so a nightly sync only transfers what
+changed since the last one.
+
+A sync pass covers the window (since, until], where `until` trails the
+clock by SYNC_SETTLE_SECONDS so writes still in flight when the pass
+starts fall into the next window instead of being skipped. Each table is
+walked in (updated_at, id) order on its index, `limit` rows per table per
+request; the token carries every table's position until the pass is
+done, and then becomes the start of the next window.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Book, Loan, Tombstone
+
+# Output column -> ORM attribute, per synced table
+BOOK_FIELDS = {
+    'id': 'id', 'title': 'title', 'author': 'author', 'isbn': 'isbn', 'published_date': 'published_date',
+    'genre': 'genre', 'available_copies': 'available_copies', 'lifetime_loans': 'lifetime_loans',
+}
+LOAN_FIELDS = {
+    'id': 'id', 'user': 'user_id', 'book': 'book_id', 'loan_date': 'loan_date', 'due_date': 'due_date',
+    'return_date': 'return_date', 'overdue': 'overdue', 'fine': 'fine',
+}
+
+
+def encode_token(state):
+    payload = json.dumps(state, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    Returns the sync state in `token`: {'since': iso|None, 'until': iso,
+    'keys': {table: [iso, id] | None | 'done'}} mid-pass, or just
+    {'since': iso|None} between passes.
+    """
+    if not token:
+        return {'since': None}
+    try:
+        state = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        keys = [key[0] for key in state.get('keys', {}).values() if isinstance(key, list)]
+        for value in [state['since'], state.get('until'), *keys]:
+            if value is not None:
+                datetime.fromisoformat(value)
+        return state
+    except (ValueError, KeyError, TypeError, IndexError):
+        raise ValidationError({'since': ['Invalid sync token.']})
+
+
+def after(field, key):
+    # Rows strictly after `key` in (field, id) order, as an index range
+    moment, last_id = datetime.fromisoformat(key[0]), key[1]
+    if last_id is None:
+        return Q(**{f'{field}__gt': moment})
+    return Q(**{f'{field}__gte': moment}) & (Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': last_id}))
+
+
+def walk(queryset, field, columns, key, until, limit):
+    """
+    Returns (rows, next_key) for up to `limit` rows of `queryset` after
+    `key` and up to `until`; next_key is None once the window is exhausted.
+    """
+    queryset = queryset.filter(**{f'{field}__lte': until})
+    if key is not None:
+        queryset = queryset.filter(after(field, key))
+    rows = list(queryset.order_by(field, 'id').values_list(field, *columns)[:limit + 1])
+    if len(rows) <= limit:
+        return [row[1:] for row in rows], None
+    rows = rows[:limit]
+    return [row[1:] for row in rows], [rows[-1][0].isoformat(), rows[-1][1]]
+
+
+def loans_of(user):
+    """
+    Which loans (and loan tombstones) a user syncs: all for staff, their
+    own for other users, none anonymously. Books are public.
+    """
+    if user.is_staff:
+        return Q()
+    if not user.is_authenticated:
+        return Q(pk__in=[])
+    return Q(user_id=user.pk)
+
+
+def sync_batch(user, token, limit):
+    """
+    Builds one /api/sync/ response: changed books and loans (as column
+    lists plus rows), deleted ids, whether more batches follow in this
+    pass, and the token to send next.
+    """
+    state = decode_token(token)
+    if state.get('until') is None:
+        # Start a pass; `until` never goes back past the previous one
+        since = state['since']
+        until = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        if since is not None:
+            until = max(until, datetime.fromisoformat(since))
+        start = [since, None] if since is not None else None
+        state = {'since': since, 'until': until.isoformat(), 'keys': dict.fromkeys(['books', 'loans', 'deleted'], start)}
+    until, keys = datetime.fromisoformat(state['until']), state['keys']
+
+    # A finished table is marked 'done'; the others continue from their key
+    tables = {
+        'books': (Book.objects.all(), 'updated_at', list(BOOK_FIELDS.values())),
+        'loans': (Loan.objects.filter(loans_of(user)), 'updated_at', list(LOAN_FIELDS.values())),
+        'deleted': (
+            Tombstone.objects.filter(Q(kind=Tombstone.BOOK) | Q(loans_of(user), kind=Tombstone.LOAN)),
+            'deleted_at', ['kind', 'object_id'],
+        ),
+    }
+    results, next_keys = {}, {}
+    for name, (queryset, field, columns) in tables.items():
+        if keys.get(name) == 'done':
+            results[name], next_keys[name] = [], 'done'
+            continue
+        rows, key = walk(queryset, field, columns, keys.get(name), until, limit)
+        results[name], next_keys[name] = rows, key or 'done'
+
+    more = any(key != 'done' for key in next_keys.values())
+    if more:
+        next_state = {'since': state['since'], 'until': state['until'], 'keys': next_keys}
+    else:
+        next_state = {'since': state['until']}
+    deleted = {'books': [], 'loans': []}
+    for kind, object_id in results['deleted']:
+        deleted['books' if kind == Tombstone.BOOK else 'loans'].append(object_id)
+    return {
+        'books': {'fields': list(BOOK_FIELDS), 'rows': results['books']},
+        'loans': {'fields': list(LOAN_FIELDS), 'rows': results['loans']},
+        'deleted': deleted,
+        'more': more,
+        'next': encode_token(next_state),
+    }
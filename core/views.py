@@ -4,17 +4,40 @@ from rest_framework import viewsets, generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.shortcuts import render
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.db import transaction
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from datetime import timedelta
 
 # Import filters
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import CustomUser, Book, Loan
+from .models import CustomUser, Book, Loan, LoanHistory, GenreCirculation, RelatedBook
 from .serializers import (
     CustomUserSerializer, BookSerializer, LoanSerializer,
-    RegisterSerializer, ChangePasswordSerializer
+    RegisterSerializer, ChangePasswordSerializer, HoldSerializer
 )
+from . import changes, loans, stats, sync
+from .search import BookSearchFilter
+from .pagination import KeysetPagination
+from .parsers import CSVParser, JSONLinesParser, JSONLParser
+from .importers import import_books
+from .renderers import CSVRenderer, JSONLinesRenderer
+from .exports import export_response
+from .cache import CatalogueCacheMixin, invalidate_catalogue, stats as catalogue_cache_stats
+from .authentication import revoke_tokens
+from .profiling import ProfiledViewMixin, metrics
+from .fastpath import ValuesListMixin
+from .sparse import SparseQuerysetMixin
+from .sqlite import serialized_write
+from .replicas import PinAfterWriteMixin, ReplicaReadMixin
+from .archive import IncludeArchivedMixin
 
 # core/views.py
 from django.shortcuts import render
@@ -25,12 +48,24 @@ def frontend_view(request):
     """
     return render(request, 'index.html')
 
+def metrics_view(request):
+    """
+    Prometheus text exposition of this process's request metrics, served
+    only while settings.PROFILING is on.
+    """
+    if not settings.PROFILING:
+        raise Http404
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ... (your existing ViewSets for API) ...
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(ProfiledViewMixin, ReplicaReadMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAdminUser] # Only admins can manage users
+    pagination_class = KeysetPagination # ?cursor= opts into keyset paging
 
     # Filtering, Searching, Ordering for CustomUser
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -38,6 +73,10 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     search_fields = ['email', 'first_name', 'last_name']
     ordering_fields = ['email', 'first_name', 'last_name', 'date_joined']
 
+    def perform_destroy(self, instance):
+        revoke_tokens(instance)
+        instance.delete()
+
     @action(detail=False, methods=['post'], permission_classes=[AllowAny], url_path='register')
     def register(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -52,28 +91,109 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        user.save() # Tokens issued with the old password are revoked (core/signals.py)
         return Response({'message': 'Password updated successfully'}, status=status.HTTP_200_OK)
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(
+    ProfiledViewMixin, ReplicaReadMixin, CatalogueCacheMixin, ValuesListMixin, SparseQuerysetMixin, viewsets.ModelViewSet
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    pagination_class = KeysetPagination # ?cursor= opts into keyset paging
+    lookup_value_regex = r'\d+'
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
-            return [AllowAny()] # Anyone can view books
+        if self.action in ['list', 'retrieve', 'related']:
+            return [AllowAny()] # Anyone can view books and their recommendations
+        if self.action in ['borrow', 'return_book', 'hold']:
+            return [IsAuthenticated()] # Any logged-in user can borrow/return/queue
         return [IsAdminUser()] # Only admin can create, update, delete books
 
     # Filtering, Searching, Ordering for Book
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # ?search= is served by the full-text backend in core/search.py
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
     filterset_fields = ['author', 'genre', 'published_date', 'available_copies']
     search_fields = ['title', 'author', 'isbn', 'genre']
     ordering_fields = ['title', 'author', 'published_date', 'available_copies']
 
-class LoanViewSet(viewsets.ModelViewSet):
-    queryset = Loan.objects.all()
+    @action(detail=False, methods=['post'], url_path='import',
+            parser_classes=[JSONLinesParser, JSONLParser, CSVParser])
+    def bulk_import(self, request):
+        # Body is a JSON Lines or CSV stream; rows are validated and upserted
+        # on ISBN in batches, and bad rows are reported rather than aborting
+        report = import_books(request.data)
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(catalogue_cache_stats.snapshot())
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[CSVRenderer, JSONLinesRenderer])
+    def export(self, request):
+        # ?format=csv|jsonl; honours the same filters as the list endpoint
+        fields = {
+            name: name
+            for name in (
+                'id', 'title', 'author', 'isbn', 'published_date', 'genre', 'available_copies', 'lifetime_loans',
+            )
+        }
+        return export_response(
+            request, self.filter_queryset(self.get_queryset()), fields, 'books', request.accepted_renderer.format
+        )
+
+    @action(detail=True, methods=['get'], url_path='related')
+    def related(self, request, pk=None):
+        # "Borrowers also borrowed", precomputed by `manage.py
+        # build_recommendations`: one lookup on the (book, rank) index
+        rows = RelatedBook.objects.filter(book_id=pk).order_by('rank').values_list(
+            'related_id', 'related__title', 'related__author', 'co_borrowers'
+        )
+        related = [
+            {'id': book_id, 'title': title, 'author': author, 'co_borrowers': co_borrowers}
+            for book_id, title, author, co_borrowers in rows
+        ]
+        if not related and not Book.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(related)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='borrow')
+    def borrow(self, request, pk=None):
+        loan = loans.borrow_book(request.user, pk)
+        return Response(LoanSerializer(loan).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='return')
+    def return_book(self, request, pk=None):
+        loan = loans.return_book(request.user, pk)
+        return Response(LoanSerializer(loan).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get', 'post', 'delete'], permission_classes=[IsAuthenticated], url_path='hold')
+    def hold(self, request, pk=None):
+        # POST joins the queue for an unavailable book, DELETE leaves it and
+        # GET reports the caller's position (an aggregate over the queue index)
+        if request.method == 'DELETE':
+            loans.cancel_hold(request.user, pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method == 'POST':
+            loans.place_hold(request.user, pk)
+        hold, position, queue_length = loans.hold_status(request.user, pk)
+        serializer = HoldSerializer(hold, context={'position': position, 'queue_length': queue_length})
+        return Response(serializer.data, status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK)
+
+class LoanViewSet(ProfiledViewMixin, PinAfterWriteMixin, ValuesListMixin, SparseQuerysetMixin, IncludeArchivedMixin,
+                  viewsets.ModelViewSet):
+    # Join users and books up front and load only what LoanSerializer reads,
+    # so a page of loans is one query instead of 1 + 2 per row
+    queryset = Loan.objects.select_related('user', 'book').only(
+        'id', 'user', 'book', 'loan_date', 'due_date', 'return_date', 'overdue', 'fine', 'user__email', 'book__title'
+    )
+    # The same, over live and archived loans, for ?include_archived=1 reads
+    history_queryset = LoanHistory.objects.select_related('user', 'book').only(
+        'id', 'user', 'book', 'loan_date', 'due_date', 'return_date', 'overdue', 'fine', 'user__email', 'book__title'
+    )
     serializer_class = LoanSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination # ?cursor= opts into keyset paging
 
     # Filtering, Searching, Ordering for Loan
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -81,12 +201,168 @@ class LoanViewSet(viewsets.ModelViewSet):
     search_fields = ['user__email', 'book__title', 'book__author']
     ordering_fields = ['loan_date', 'return_date']
 
+    @serialized_write
     def perform_create(self, serializer):
-        # Automatically set the user for a new loan to the requesting user
-        serializer.save(user=self.request.user)
+        # Automatically set the user for a new loan to the requesting user,
+        # taking a copy of the book in the same transaction
+        with transaction.atomic():
+            loans.take_copy(serializer.validated_data['book'].pk)
+            loan = serializer.save(user=self.request.user)
+            stats.loan_opened(loan)
+            changes.record(changes.book_entries([loan.book_id]) + changes.loan_entries([loan]))
+
+    @serialized_write
+    def perform_update(self, serializer):
+        # Closing a loan through PATCH/PUT puts the copy back on the shelf
+        with transaction.atomic():
+            was_open = serializer.instance.return_date is None
+            loan = serializer.save()
+            closed = was_open and loan.return_date is not None
+            if closed:
+                loans.put_back_copy(loan.book_id)
+                stats.loan_closed(loan)
+            changes.record(changes.book_entries([loan.book_id] if closed else []) + changes.loan_entries([loan]))
+
+    @serialized_write
+    def perform_destroy(self, instance):
+        # The book changes either way: lifetime_loans drops with the loan
+        with transaction.atomic():
+            if instance.return_date is None:
+                loans.put_back_copy(instance.book_id)
+            stats.loan_deleted(instance)
+            invalidate_catalogue()
+            changes.record(
+                changes.book_entries([instance.book_id]) + changes.loan_entries([instance], deleted=True)
+            )
+            instance.delete()
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[CSVRenderer, JSONLinesRenderer])
+    def export(self, request):
+        # ?format=csv|jsonl; honours the same filters as the list endpoint,
+        # and regular users still only get their own loans
+        fields = {
+            'id': 'id', 'user': 'user', 'book': 'book', 'loan_date': 'loan_date',
+            'return_date': 'return_date', 'user_email': 'user__email', 'book_title': 'book__title',
+        }
+        return export_response(
+            request, self.filter_queryset(self.get_queryset()), fields, 'loans', request.accepted_renderer.format
+        )
+
+    def bulk_target(self, request):
+        # The user a bulk operation acts for: staff may name anyone (or no
+        # one, meaning any holder), everyone else only themselves
+        user_id = request.data.get('user')
+        if user_id is None:
+            return None if request.user.is_staff else request.user
+        if isinstance(user_id, bool) or not isinstance(user_id, int):
+            raise ValidationError({'user': ['A valid integer is required.']})
+        if user_id == request.user.pk:
+            return request.user
+        if not request.user.is_staff:
+            raise PermissionDenied('Only staff can borrow or return for another user.')
+        return get_object_or_404(CustomUser, pk=user_id)
+
+    @action(detail=False, methods=['post'], url_path='bulk-borrow')
+    def bulk_borrow(self, request):
+        # {"books": [<id> | "<isbn>", ...], "user": <id, staff only>}
+        user = self.bulk_target(request) or request.user
+        results = loans.bulk_borrow(user, request.data.get('books'))
+        return Response(bulk_summary(results, 'borrowed'), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk-return')
+    def bulk_return(self, request):
+        # Staff without "user" close the oldest open loan of each book,
+        # whoever holds it (a returns cart)
+        user = self.bulk_target(request)
+        results = loans.bulk_return(user or request.user, request.data.get('books'), any_user=user is None)
+        return Response(bulk_summary(results, 'returned'), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='my')
+    def my_loans(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(user=request.user).order_by('-loan_date', '-id')
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
     def get_queryset(self):
         # Allow admin to see all loans, but regular users only their own loans
+        queryset = super().get_queryset()
         if self.request.user.is_staff:
-            return Loan.objects.all()
-        return Loan.objects.filter(user=self.request.user)
\ No newline at end of file
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+def bulk_summary(results, succeeded):
+    done = sum(1 for result in results if result['status'] == succeeded)
+    return {succeeded: done, 'failed': len(results) - done, 'results': results}
+
+class StatsView(generics.GenericAPIView):
+    """
+    Circulation statistics read straight from the incrementally maintained
+    counters (core/stats.py), so no request aggregates the Loan table.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
+            return Response({'days': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        since = timezone.localdate() - timedelta(days=days - 1)
+
+        most_borrowed = Book.objects.order_by('-lifetime_loans', 'id').values(
+            'id', 'title', 'author', 'lifetime_loans'
+        )[:10]
+        circulation = GenreCirculation.objects.filter(day__gte=since).order_by('day', 'genre').values(
+            'day', 'genre', 'loans', 'returns'
+        )
+        return Response({
+            'my_active_loans': request.user.active_loans,
+            'most_borrowed': list(most_borrowed),
+            'daily_circulation': list(circulation),
+        })
+
+
+class ChangeFeedView(generics.GenericAPIView):
+    """
+    Long-poll change feed (core/changes.py). Without ?since= it returns the
+    current cursor: take it, load what you need (e.g. /api/books/), then
+    poll ?since=<cursor>. Each call blocks for up to ?wait= seconds
+    (CHANGE_FEED_WAIT at most) until something changes.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        since = changes.parse_cursor(request.query_params.get('since'))
+        if since is None:
+            return Response({'cursor': changes.latest_sequence(), 'changes': []})
+        limit = settings.CHANGE_FEED_WAIT
+        try:
+            wait = min(max(float(request.query_params.get('wait', limit)), 0), limit)
+        except ValueError:
+            return Response({'wait': ['A valid number is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        events, cursor = changes.wait_for_changes(request.user, since, wait)
+        return Response({'cursor': cursor, 'changes': events})
+
+
+@method_decorator(gzip_page, name='dispatch')
+class SyncView(generics.GenericAPIView):
+    """
+    Delta sync (core/sync.py). Call without ?since= for a full download,
+    follow `next` while `more` is true, and keep the last `next` for the
+    following sync. ?limit= caps the rows per table per batch.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', settings.SYNC_BATCH)), 1), settings.SYNC_MAX_BATCH)
+        except ValueError:
+            return Response({'limit': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.sync_batch(request.user, request.query_params.get('since'), limit))
+
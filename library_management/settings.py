@@ -34,15 +34,27 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    'core.middleware.AsyncWhiteNoiseMiddleware', # WhiteNoise that doesn't force ASGI requests onto a thread
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.HashingBusyMiddleware', # 503 for a full hashing pool outside DRF (admin login)
 ]
 
+# Opt-in request profiling (core.middleware.ProfilingMiddleware): adds a
+# Server-Timing header, serves Prometheus metrics on /metrics (guarded by
+# METRICS_TOKEN as a bearer token when set) and cProfiles
+# PROFILING_SAMPLE_RATE percent of requests into PROFILING_DUMP_DIR.
+PROFILING = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DUMP_DIR = os.environ.get('PROFILING_DUMP_DIR', str(BASE_DIR / 'profiles'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+if PROFILING:
+    MIDDLEWARE.insert(0, 'core.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'library_management.urls'
 
 TEMPLATES = [
@@ -70,6 +82,43 @@ DATABASES = {
     )
 }
 
+# Read replicas: DATABASE_REPLICA_URLS=url1,url2 adds aliases replica1,
+# replica2, ... Safe-method requests to /api/books/ and /api/users/ read
+# from one of them; writes stay on `default`, and a user's own write pins
+# their reads to `default` for REPLICA_STICKY_SECONDS (core/replicas.py).
+# The pin is a signed cookie/header the client sends back, so it holds
+# whichever worker serves the next request.
+DATABASE_REPLICAS = []
+for _n, _url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{_n}'] = {**dj_database_url.parse(_url.strip(), conn_max_age=600), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{_n}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# SQLite production mode (SQLITE_PRODUCTION=1) for branches running
+# several workers on one SQLite file: WAL so readers never block the
+# writer, writers wait up to SQLITE_BUSY_TIMEOUT seconds for the lock
+# instead of failing with "database is locked", and transactions start
+# with BEGIN IMMEDIATE so a writer takes the lock up front rather than
+# failing when it upgrades from reading. SQLITE_WRITE_QUEUE=1 additionally
+# funnels loan/book writes of each process through one thread and
+# connection (core/sqlite.py).
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '').lower() in ('1', 'true', 'yes')
+SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', '').lower() in ('1', 'true', 'yes')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Durable across app crashes; only an OS crash may lose the last commits
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 32768)),  # Negative = KiB per connection
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+if SQLITE_PRODUCTION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
     { 'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
@@ -77,6 +126,34 @@ AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator', },
 ]
 
+# Password hashing strategy (see core/hashers.py). PASSWORD_HASHER picks the
+# hasher new passwords use: 'pbkdf2' (Django's default), 'scrypt' or
+# 'argon2' (needs argon2-cffi). The others stay listed so existing hashes
+# verify, and are upgraded to the preferred one on the user's next login.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.PooledPBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.TunedScryptPasswordHasher',
+    'argon2': 'core.hashers.TunedArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+# Argon2id at OWASP's 19 MiB / 2 passes / 1 lane profile, far cheaper per
+# login than Django's 100 MiB / 8 lanes; scrypt keeps Django's defaults.
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+SCRYPT_WORK_FACTOR = int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14))
+SCRYPT_BLOCK_SIZE = int(os.environ.get('SCRYPT_BLOCK_SIZE', 8))
+SCRYPT_PARALLELISM = int(os.environ.get('SCRYPT_PARALLELISM', 5))
+# Hashing runs on a bounded pool of this many threads (or processes) so a
+# login burst can't occupy every CPU; beyond PASSWORD_HASH_QUEUE waiting
+# hashes requests get 503 + Retry-After. 0 hashes inline.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_POOL = os.environ.get('PASSWORD_HASH_POOL', 'thread')  # or 'process'
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -90,9 +167,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.CustomUser'
 
+# JSON_RENDERER=orjson encodes API responses with orjson (same bytes,
+# less CPU; falls back to the json module if orjson isn't installed).
+# FAST_LIST_SERIALIZERS serves book and loan lists from .values() rows
+# (core/fastpath.py) instead of model instances.
+JSON_RENDERER = os.environ.get('JSON_RENDERER', 'json')
+FAST_LIST_SERIALIZERS = os.environ.get('FAST_LIST_SERIALIZERS', '1').lower() in ('1', 'true', 'yes')
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer' if JSON_RENDERER == 'orjson' else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Trusts signed user_id/is_staff/token_version claims instead of
+        # fetching the user per request (see core/authentication.py)
+        'core.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -108,6 +198,99 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+
+def cache_from_url(url, location):
+    """
+    A CACHES entry for dummy://, file:///path/to/dir, redis://host:6379/0
+    (rediss:// too; needs the redis package) or anything else as locmem.
+    """
+    if url.startswith(('redis://', 'rediss://')):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if url.startswith('file://'):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': url[len('file://'):]}
+    if url.startswith('dummy://'):
+        return {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': location}
+
+
+# Cache for /api/books/ list/retrieve responses (see core/cache.py).
+# CATALOGUE_CACHE_URL: dummy:// (default, no caching), file:///path/to/dir,
+# redis://host:6379/0 (any Redis-protocol server; needs the redis package)
+# or locmem://. The version counter that invalidates entries lives in the
+# cache, so only a backend shared by every worker keeps them fresh;
+# locmem:// is for a single process and logs a warning at startup.
+CATALOGUE_CACHE_URL = os.environ.get('CATALOGUE_CACHE_URL', 'dummy://')
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalogue': cache_from_url(CATALOGUE_CACHE_URL, 'catalogue'),
+}
+CATALOGUE_CACHE_ALIAS = 'catalogue'
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get('CATALOGUE_CACHE_TIMEOUT', 300))
+
+# Where revoked token versions are shared between workers, in the same
+# URL forms as CATALOGUE_CACHE_URL. ClaimsJWTAuthentication only trusts
+# the is_staff and token_version claims when this is set; unset, every
+# authenticated request loads its user (and checks is_active) from the
+# database (dummy:// counts as unset). locmem:// is for a single process
+# and logs a warning.
+TOKEN_VERSION_CACHE_URL = os.environ.get('TOKEN_VERSION_CACHE_URL', '')
+TOKEN_VERSION_CACHE_ALIAS = None
+if TOKEN_VERSION_CACHE_URL and not TOKEN_VERSION_CACHE_URL.startswith('dummy://'):
+    CACHES['tokens'] = cache_from_url(TOKEN_VERSION_CACHE_URL, 'tokens')
+    TOKEN_VERSION_CACHE_ALIAS = 'tokens'
+
+# Loans are due LOAN_PERIOD_DAYS after they start. `manage.py
+# process_overdue` (core/overdue.py) marks open loans past due and sets
+# their fine to OVERDUE_FINE_PER_DAY per day late, capped at
+# OVERDUE_FINE_CAP, walking OVERDUE_BATCH loans per transaction.
+LOAN_PERIOD_DAYS = int(os.environ.get('LOAN_PERIOD_DAYS', 14))
+OVERDUE_FINE_PER_DAY = os.environ.get('OVERDUE_FINE_PER_DAY', '0.25')
+OVERDUE_FINE_CAP = os.environ.get('OVERDUE_FINE_CAP', '10.00')
+OVERDUE_BATCH = int(os.environ.get('OVERDUE_BATCH', 5000))
+
+# `manage.py archive_loans` (core/archive.py) moves loans returned more
+# than LOAN_ARCHIVE_DAYS ago into ArchivedLoan, LOAN_ARCHIVE_BATCH per
+# transaction. /api/loans/ serves them again with ?include_archived=1.
+LOAN_ARCHIVE_DAYS = int(os.environ.get('LOAN_ARCHIVE_DAYS', 365))
+LOAN_ARCHIVE_BATCH = int(os.environ.get('LOAN_ARCHIVE_BATCH', 5000))
+
+# "Borrowers also borrowed" (core/recommendations.py): how many neighbours
+# `manage.py build_recommendations` keeps per book, and how many users'
+# loan histories it reads per chunk.
+RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', 10))
+RECOMMENDATIONS_CHUNK_USERS = int(os.environ.get('RECOMMENDATIONS_CHUNK_USERS', 1000))
+
+# Change feed (core/changes.py): how often waiting clients look for
+# changes made by other processes, how long a long-poll on /api/changes/
+# may block, and how long an SSE stream on /api/changes/stream/ stays open
+# before the client reconnects (an idle stream sends a comment every
+# CHANGE_FEED_HEARTBEAT seconds so proxies keep it open). Long-polls hold
+# a worker thread, so the WSGI launch (Procfile, Dockerfile) runs gunicorn
+# with gthread workers (GUNICORN_THREADS threads each); keep it that way.
+CHANGE_FEED_POLL_INTERVAL = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1.0))
+CHANGE_FEED_WAIT = float(os.environ.get('CHANGE_FEED_WAIT', 25))
+CHANGE_FEED_STREAM_SECONDS = float(os.environ.get('CHANGE_FEED_STREAM_SECONDS', 300))
+CHANGE_FEED_HEARTBEAT = float(os.environ.get('CHANGE_FEED_HEARTBEAT', 15))
+# At most CHANGE_FEED_MAX_WAITERS long-polls per process sit waiting (half
+# the default 16 threads), so idle clients can't take every thread of a
+# worker; past that a poll with nothing to return gets 503 + Retry-After.
+CHANGE_FEED_MAX_WAITERS = int(os.environ.get('CHANGE_FEED_MAX_WAITERS', 8))
+CHANGE_FEED_BATCH = 200
+CHANGE_FEED_RETENTION_DAYS = int(os.environ.get('CHANGE_FEED_RETENTION_DAYS', 7))
+
+# Delta sync (core/sync.py): rows per table per /api/sync/ batch (clients
+# may ask for up to SYNC_MAX_BATCH), and how far a sync window trails the
+# clock, which must exceed the longest write transaction.
+SYNC_BATCH = int(os.environ.get('SYNC_BATCH', 1000))
+SYNC_MAX_BATCH = 10000
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 60))
+
+# Backend for ?search= on /api/books/ (see core/search.py): 'auto' picks
+# Postgres tsvector or SQLite FTS5 by database vendor, 'icontains' keeps
+# DRF's SearchFilter, or a dotted path to a BookSearchBackend subclass.
+BOOK_SEARCH_BACKEND = os.environ.get('BOOK_SEARCH_BACKEND', 'auto')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -135,6 +318,9 @@ SIMPLE_JWT = {
 
     'JTI_CLAIM': 'jti',
 
+    'TOKEN_OBTAIN_SERIALIZER': 'core.serializers.LibraryTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.LibraryTokenRefreshSerializer',
+
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
\ No newline at end of file
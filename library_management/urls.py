@@ -7,7 +7,8 @@ from rest_framework import routers # Ensure this is imported
 # ... other imports ...
 
 # Define your ViewSets from core.views
-from core.views import CustomUserViewSet, BookViewSet, LoanViewSet, frontend_view
+from core.views import CustomUserViewSet, BookViewSet, LoanViewSet, StatsView, ChangeFeedView, SyncView, frontend_view, metrics_view
+from core import async_views
 
 # DRF-YASG Schema View (already there)
 from rest_framework import permissions
@@ -51,6 +52,18 @@ urlpatterns = [
     path('api/', include(router.urls)), # This line requires 'router' to be defined above
     path('api/users/register/', CustomUserViewSet.as_view({'post': 'register'}), name='user-register'),
     path('api/users/<int:pk>/change-password/', CustomUserViewSet.as_view({'post': 'change_password'}), name='user-change-password'),
+    path('api/books/<int:pk>/borrow/', BookViewSet.as_view({'post': 'borrow'}), name='borrow_book'),
+    path('api/books/<int:pk>/return/', BookViewSet.as_view({'post': 'return_book'}), name='return_book'),
+    path('api/loans/my/', LoanViewSet.as_view({'get': 'my_loans'}), name='my_loans'),
+    path('api/stats/', StatsView.as_view(), name='stats'),
+    path('api/changes/', ChangeFeedView.as_view(), name='changes'),
+    path('api/changes/stream/', async_views.change_stream, name='change_stream'),
+    path('api/sync/', SyncView.as_view(), name='sync'),
+    # Async read path, best served by an ASGI server (see README)
+    path('api/async/books/', async_views.book_list, name='async_book_list'),
+    path('api/async/books/<int:pk>/', async_views.book_detail, name='async_book_detail'),
+    path('api/async/loans/my/', async_views.my_loans, name='async_my_loans'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 